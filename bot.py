@@ -12,16 +12,26 @@ import websockets
 from discord.ext import commands
 from motor.motor_asyncio import AsyncIOMotorClient
 
+from essentials.garbagecollector import GarbageCollector
+from essentials.indexes import ensure_indexes
+from essentials.legacyvotes import LegacyVotes
 from essentials.membercache import MemberCache
 from essentials.messagecache import MessageCache
+from essentials.pollcache import PollCache
 from essentials.multi_server import get_pre
+from essentials.pollindex import PollIndex
+from essentials.reactioncleanup import ReactionCleanup
+from essentials.refreshscheduler import RefreshScheduler
 from essentials.settings import SETTINGS
+from essentials.votebuffer import VoteBuffer
+from migrations.runner import get_pending_migrations, run_required_migrations
 
 
 class ClusterBot(commands.AutoShardedBot):
     def __init__(self, **kwargs):
         self.pipe = kwargs.pop('pipe')
         self.cluster_name = kwargs.pop('cluster_name')
+        message_cache_size = kwargs.pop('message_cache_size', SETTINGS.message_cache_size)
         loop = asyncio.new_event_loop()
         asyncio.set_event_loop(loop)
         super().__init__(**kwargs, loop=loop)
@@ -45,14 +55,22 @@ class ClusterBot(commands.AutoShardedBot):
 
         self.remove_command('help')
         self.load_extension("cogs.eval")
-        extensions = ['cogs.config', 'cogs.poll_controls', 'cogs.help', 'cogs.db_api', 'cogs.admin']
+        extensions = ['cogs.config', 'cogs.poll_controls', 'cogs.help', 'cogs.db_api', 'cogs.admin', 'cogs.maintenance']
         for ext in extensions:
             self.load_extension(ext)
 
-        self.message_cache = MessageCache(self)
-        self.member_cache = MemberCache()
-        self.refresh_blocked = {}
-        self.refresh_queue = {}
+        self.message_cache = MessageCache(self, message_cache_size, SETTINGS.message_cache_ttl)
+        self.member_cache = MemberCache(SETTINGS.member_cache_size, SETTINGS.member_cache_ttl,
+                                        SETTINGS.member_cache_negative_ttl)
+        self.poll_index = PollIndex(self)
+        self.poll_cache = PollCache(SETTINGS.poll_cache_size, SETTINGS.poll_cache_ttl)
+        self.legacy_votes = LegacyVotes(self)
+        self.vote_buffer = VoteBuffer(self, SETTINGS.vote_write_behind, SETTINGS.vote_flush_delay,
+                                      SETTINGS.vote_ballot_cache_size)
+        self.refresh_scheduler = RefreshScheduler(self)
+        self.reaction_cleanup = ReactionCleanup(self)
+        self.garbage_collector = GarbageCollector(self, SETTINGS.gc_batch_size, SETTINGS.gc_pause,
+                                                 SETTINGS.gc_grace_days * 24 * 3600)
 
         self.loop.create_task(self.ensure_ipc())
         self.run(kwargs['token'])
@@ -82,6 +100,18 @@ class ClusterBot(commands.AutoShardedBot):
             self.emoji_dict = json.load(emojson)
         self.pre = {entry['_id']: entry.get('prefix', 'pm!') async for entry in
                    self.db.config.find({}, {'_id', 'prefix'})}
+        try:
+            await ensure_indexes(self.db)
+            await run_required_migrations(self.db)
+        except Exception:
+            self.log.exception(f'[Cluster#{self.cluster_name}] The database is not ready, shutting down.')
+            await self.close()
+            return
+        pending = await get_pending_migrations(self.db)
+        if pending:
+            self.log.error(f'Migrations not done: {", ".join(pending)}. Run python -m migrations.runner.')
+        await self.legacy_votes.check()
+        await self.poll_index.load([g.id for g in self.guilds])
         await self.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name="pm!help"))
 
         self.log.info(f'[Cluster#{self.cluster_name}] Ready called.')
@@ -97,6 +127,18 @@ class ClusterBot(commands.AutoShardedBot):
                 upsert=True
             )
             self.pre[str(server.id)] = 'pm!'
+        await self.garbage_collector.cancel_guild(server.id)
+        await self.poll_index.load([server.id])
+
+    async def on_guild_remove(self, server):
+        await self.garbage_collector.enqueue_guild(server.id)
+        self.member_cache.forget_guild(server.id)
+
+    async def on_member_update(self, before, after):
+        self.member_cache.update(after)
+
+    async def on_member_remove(self, member):
+        self.member_cache.remove(member.guild.id, member.id)
 
     async def on_shard_ready(self, shard_id):
         self.log.info(f'[Cluster#{self.cluster_name}] Shard {shard_id} ready')
@@ -120,6 +162,7 @@ class ClusterBot(commands.AutoShardedBot):
 
     async def close(self, *args, **kwargs):
         self.log.info("shutting down")
+        await self.vote_buffer.close()
         await self.websocket.close()
         await super().close()
 
@@ -2,6 +2,8 @@ import logging
 
 from discord.ext import commands
 
+from essentials.indexes import audit_indexes, ensure_indexes
+
 
 class Admin(commands.Cog):
     def __init__(self, bot):
@@ -53,6 +55,46 @@ class Admin(commands.Cog):
             logger.info(reply)
             await ctx.send(reply)
 
+    @commands.command()
+    async def cachestats(self, ctx):
+        """Show the statistics of the caches of this cluster."""
+        stats = {
+            'poll cache': self.bot.poll_cache.stats(),
+            'message cache': self.bot.message_cache.stats(),
+            'member cache': self.bot.member_cache.stats(),
+            'vote buffer': self.bot.vote_buffer.stats(),
+            'legacy votes': self.bot.legacy_votes.stats(),
+            'refresh scheduler': self.bot.refresh_scheduler.stats(),
+            'reaction cleanup': self.bot.reaction_cleanup.stats()
+        }
+        reply = ''
+        for name, values in stats.items():
+            reply += f'**{name}**: ' + ', '.join(f'{k}: {v}' for k, v in values.items()) + '\n'
+        await ctx.send(reply)
+
+    @commands.command()
+    async def indexaudit(self, ctx):
+        """Explain the hot queries and report the ones that scan a whole collection."""
+        await ensure_indexes(self.bot.db)
+        report = await audit_indexes(self.bot.db)
+        scans = [(name, collection, stages) for name, collection, stages in report if 'COLLSCAN' in stages]
+        reply = f'Explained {len(report)} queries, {len(scans)} collection scans.\n'
+        for name, collection, stages in report:
+            flag = ':x:' if 'COLLSCAN' in stages else ':white_check_mark:'
+            reply += f'{flag} **{name}** ({collection}): {" <- ".join(s for s in stages if s)}\n'
+        await ctx.send(reply)
+
+    @commands.command()
+    async def gc(self, ctx, *, cmd=None):
+        """Show what the garbage collector has reclaimed. "gc scan" queues votes of polls that don't exist."""
+        reply = ''
+        if cmd == 'scan':
+            found = await self.bot.garbage_collector.scan()
+            reply += f'Queued {found} deleted polls.\n'
+        stats = self.bot.garbage_collector.stats()
+        reply += '**garbage collector**: ' + ', '.join(f'{k}: {v}' for k, v in stats.items())
+        await ctx.send(reply)
+
 
 def setup(bot):
     global logger
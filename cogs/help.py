@@ -166,12 +166,16 @@ class Help(commands.Cog):
                             value='This will *permanently and irreversibly* delete a poll from the database. '
                                   'Once done, the label is freed up and can be assigned again.',
                             inline=False)
-            embed.add_field(name=f'🔹 **Export** `{pre}export <poll_label>`',
+            embed.add_field(name=f'🔹 **Recount** `{pre}recount <poll_label>`',
+                            value='Counts the votes of a poll again and shows the poll with the new results. Use this '
+                                  'if the numbers of a poll look wrong.',
+                            inline=False)
+            embed.add_field(name=f'🔹 **Export** `{pre}export <poll_label> <txt|csv|jsonl>`',
                             value='You can use this command or react with 📎 to a closed poll to generate a report. '
                                   'The report will then be sent to you in discord via the bot. This utf8-textfile '
                                   '(make sure to open it in an utf8-ready editor) will contain all the infos about the '
                                   'poll, including a detailed list of participants and their votes (just a list of names '
-                                  'for anonymous polls).',
+                                  'for anonymous polls). With `csv` or `jsonl` you get one row per vote instead.',
                             inline=False)
             embed.add_field(name=f'🔹 **Activate** `{pre}activate <poll_label>`',
                             value=f'To see how you can prepare inactive polls read the `{pre}prepare` command under Making '
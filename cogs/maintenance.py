@@ -0,0 +1,69 @@
+import datetime
+import logging
+
+from discord.ext import tasks, commands
+
+from essentials.settings import SETTINGS
+from models.archive import Archive
+from models.poll import Poll
+
+
+class Maintenance(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+        self.archive_polls.start()
+        self.collect_garbage.start()
+
+    def cog_unload(self):
+        self.archive_polls.cancel()
+        self.collect_garbage.cancel()
+
+    # noinspection PyCallingNonCallable
+    @tasks.loop(hours=1)
+    async def archive_polls(self):
+        if not hasattr(self.bot, 'db') or not hasattr(self.bot.db, 'polls') or SETTINGS.archive_after_days <= 0:
+            return
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(days=SETTINGS.archive_after_days)
+        # each cluster archives the polls of its own servers
+        server_ids = [str(g.id) for g in self.bot.guilds]
+        # the age counts from the time the poll was closed. Polls closed before that was recorded count from their
+        # deadline, or from their creation if they were closed manually.
+        query = self.bot.db.polls.find({'open': False, 'server_id': {'$in': server_ids}, '$or': [
+            {'closed_at': {'$lt': cutoff}},
+            {'closed_at': {'$exists': False}, 'duration': {'$lt': cutoff}},
+            {'closed_at': {'$exists': False}, 'duration': 0, 'time_created': {'$lt': cutoff}}
+        ]}, Poll.get_projection()).limit(SETTINGS.archive_batch_size)
+        archived = 0
+        async for pd in query:
+            try:
+                if await Archive.archive_poll(self.bot, pd):
+                    archived += 1
+            except Exception as e:
+                logger.exception(f'Could not archive poll {pd["_id"]}: {e}')
+        if archived:
+            logger.info(f'Archived {archived} closed polls.')
+
+    @archive_polls.before_loop
+    async def before_archive_polls(self):
+        await self.bot.wait_until_ready()
+
+    # noinspection PyCallingNonCallable
+    @tasks.loop(minutes=1)
+    async def collect_garbage(self):
+        if not hasattr(self.bot, 'db') or not hasattr(self.bot.db, 'gc_queue'):
+            return
+        try:
+            if await self.bot.garbage_collector.collect():
+                logger.info(f'Collected garbage: {self.bot.garbage_collector.stats()}')
+        except Exception as e:
+            logger.exception(f'Garbage collection failed: {e}')
+
+    @collect_garbage.before_loop
+    async def before_collect_garbage(self):
+        await self.bot.wait_until_ready()
+
+
+def setup(bot):
+    global logger
+    logger = logging.getLogger('discord')
+    bot.add_cog(Maintenance(bot))
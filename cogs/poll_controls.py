@@ -3,21 +3,20 @@ import datetime
 import logging
 import random
 import shlex
-import time
 from string import ascii_lowercase
 
 import discord
 import pytz
-from bson import ObjectId
 from discord.ext import tasks, commands
 
-from essentials.exceptions import StopWizard
+from essentials.exceptions import StopWizard, DuplicateInput
 from essentials.multi_server import get_server_pre, ask_for_server, ask_for_channel
+from essentials.pollindex import PollMessage
 from essentials.settings import SETTINGS
-from models.poll import Poll
+from models.poll import Poll, EXPORT_FORMATS
+from models.tally import Tally
 from utils.misc import CustomFormatter
 from utils.paginator import embed_list_paginated
-from utils.poll_name_generator import generate_word
 
 # A-Z Emojis for Discord
 AZ_EMOJIS = [(b'\\U0001f1a'.replace(b'a', bytes(hex(224 + (6 + i))[2:], "utf-8"))).decode("unicode-escape") for i in
@@ -27,15 +26,12 @@ AZ_EMOJIS = [(b'\\U0001f1a'.replace(b'a', bytes(hex(224 + (6 + i))[2:], "utf-8")
 class PollControls(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.ignore_next_removed_reaction = {}
         self.index = 0
         self.close_activate_polls.add_exception_type(KeyError)
         self.close_activate_polls.start()
-        self.refresh_queue.start()
 
     def cog_unload(self):
         self.close_activate_polls.cancel()
-        self.refresh_queue.cancel()
 
     # noinspection PyCallingNonCallable
     @tasks.loop(seconds=30)
@@ -47,7 +43,7 @@ class PollControls(commands.Cog):
             query = self.bot.db.polls.find({'open': True, 'duration': {
                 '$gte': utc_now - datetime.timedelta(weeks=8),
                 '$lte': utc_now + datetime.timedelta(minutes=1)
-            }})
+            }}, Poll.get_projection(('channel_id', 'open', 'duration', 'duration_tz')))
             if query:
                 for limit, pd in enumerate([poll async for poll in query]):
                     if limit >= 30:
@@ -55,7 +51,6 @@ class PollControls(commands.Cog):
                         logger.warning("More than 30 polls due to be closed! Throttling to 30 per 30 sec.")
                         break
 
-                    # load poll (this will close the poll if necessary and update the DB)
                     p = Poll(self.bot, load=True)
                     if not p:
                         continue
@@ -63,17 +58,27 @@ class PollControls(commands.Cog):
 
                     # Check if Pollmaster is still present on the server
                     if not p.server:
+                        # The server may belong to another cluster, which closes and announces the poll itself
+                        if p.duration.replace(tzinfo=pytz.utc) >= utc_now - datetime.timedelta(hours=2):
+                            continue
                         # Bot is not present on that server. Close poll directly in the DB.
-                        await self.bot.db.polls.update_one({'_id': p.id}, {'$set': {'open': False}})
+                        await self.bot.db.polls.update_one(
+                            {'_id': p.id, 'open': True},
+                            {'$set': {'open': False, 'closed_at': datetime.datetime.utcnow()}}
+                        )
+                        self.bot.poll_cache.invalidate(poll_id=p.id)
                         logger.info(f"Closed poll on a server ({pd['server_id']}) without Pollmaster being present.")
                         continue
-                    # Check if poll was closed and inform the sever if the poll is less than 2 hours past due
+                    # Close the poll if it is due and inform the sever if the poll is less than 2 hours past due
                     # (Closing old polls should only happen if the bot was offline for an extended period)
-                    if not p.open:
+                    # Nothing is sent if the poll was closed meanwhile, e.g. with the close command.
+                    if not p.open and await p.close():
                         if p.duration.replace(tzinfo=pytz.utc) >= utc_now - datetime.timedelta(hours=2):
                             # only send messages for polls that were supposed to expire in the past 2 hours
                             await p.channel.send('This poll has reached the deadline and is closed!')
-                            await p.post_embed(p.channel)
+                            p = await p.get_full()
+                            if p is not None:
+                                await p.post_embed(p.channel)
                         else:
                             logger.info(f"Closing old poll: {p.id}")
 
@@ -81,7 +86,7 @@ class PollControls(commands.Cog):
             query = self.bot.db.polls.find({'active': False, 'activation': {
                 '$gte': utc_now - datetime.timedelta(weeks=8),
                 '$lte': utc_now + datetime.timedelta(minutes=1)
-            }})
+            }}, Poll.get_projection(('channel_id', 'active', 'activation', 'activation_tz')))
             if query:
                 for limit, pd in enumerate([poll async for poll in query]):
                     if limit >= 10:
@@ -89,23 +94,29 @@ class PollControls(commands.Cog):
                         logger.warning("More than 10 polls due to be closed! Throttling to 10 per 30 sec.")
                         break
 
-                    # load poll (this will activate the poll if necessary and update the DB)
                     p = Poll(self.bot, load=True)
                     await p.from_dict(pd)
 
                     # Check if Pollmaster is still present on the server
                     if not p.server:
+                        # The server may belong to another cluster, which activates and announces the poll itself
+                        if p.activation.replace(tzinfo=pytz.utc) >= utc_now - datetime.timedelta(hours=2):
+                            continue
                         # Bot is not present on that server. Close poll directly in the DB.
-                        await self.bot.db.polls.update_one({'_id': p.id}, {'$set': {'active': True}})
+                        await self.bot.db.polls.update_one({'_id': p.id, 'active': False}, {'$set': {'active': True}})
+                        self.bot.poll_cache.invalidate(poll_id=p.id)
                         logger.info(f"Activated poll on a server ({pd['server_id']}) without Pollmaster being present.")
                         continue
-                    # Check if poll was activated and inform the sever if the poll is less than 2 hours past due
+                    # Activate the poll if it is due and inform the sever if the poll is less than 2 hours past due
                     # (activating old polls should only happen if the bot was offline for an extended period)
-                    if p.active:
+                    # Nothing is sent if the poll was activated meanwhile, e.g. with the activate command.
+                    if p.active and await p.activate():
                         if p.activation.replace(tzinfo=pytz.utc) >= utc_now - datetime.timedelta(hours=2):
                             # only send messages for polls that were supposed to expire in the past 2 hours
                             await p.channel.send('This poll has been scheduled and is active now!')
-                            await p.post_embed(p.channel)
+                            p = await p.get_full()
+                            if p is not None:
+                                await p.post_embed(p.channel)
                         else:
                             logger.info(f"Activating old poll: {p.id}")
 
@@ -114,30 +125,6 @@ class PollControls(commands.Cog):
         # print('close task waiting...')
         await self.bot.wait_until_ready()
 
-    @tasks.loop(seconds=5)
-    async def refresh_queue(self):
-        remove_list = []
-        for pid, t in self.bot.refresh_blocked.items():
-            if t - time.time() < 0:
-                remove_list.append(pid)
-                if self.bot.refresh_queue.get(pid, False):
-                    query = await self.bot.db.polls.find_one({'_id': ObjectId(pid)})
-                    if query:
-                        p = Poll(self.bot, load=True)
-                        if p:
-                            await p.from_dict(query)
-                            await p.refresh(self.bot.refresh_queue.get(pid))
-                            del self.bot.refresh_queue[pid]
-
-        # don't change dict while iterating
-        for pid in remove_list:
-            del self.bot.refresh_blocked[pid]
-
-    @refresh_queue.before_loop
-    async def before_refresh_queue(self):
-        # print('refresh task waiting...')
-        await self.bot.wait_until_ready()
-
     # General Methods
     @staticmethod
     def get_label(message: discord.Message):
@@ -182,15 +169,6 @@ class PollControls(commands.Cog):
         await ctx.send(embed=embed)
 
     # Commands
-    # @commands.command()
-    # async def t(self, ctx, *, test=None):
-    #     """TEST"""
-    #     server = await ask_for_server(self.bot, ctx.message)
-    #     if not server:
-    #         return
-    #     p = await Poll.load_from_db(self.bot, str(server.id), 'test', ctx=ctx)
-    #     print(await Vote.load_number_of_voters_for_poll(self.bot, p.id))
-
     @commands.command()
     async def activate(self, ctx, *, short=None):
         """Activate a prepared poll. Parameter: <label>"""
@@ -212,14 +190,13 @@ class PollControls(commands.Cog):
                 # Permission Check: Admin or Creator
                 if not await self.is_admin_or_creator(
                         ctx, server,
-                        p.author.id,
+                        p.author_id,
                         'You don\'t have sufficient rights to activate this poll. Please talk to the server admin.'
                 ):
                     return
 
                 # Activate Poll
-                p.active = True
-                await p.save_to_db()
+                await p.activate()
                 await ctx.invoke(self.show, short)
             else:
                 error = f'Poll with label "{short}" was not found. Listing prepared polls.'
@@ -245,14 +222,19 @@ class PollControls(commands.Cog):
                 # Permission Check: Admin or Creator
                 if not await self.is_admin_or_creator(
                         ctx, server,
-                        p.author.id,
+                        p.author_id,
                         'You don\'t have sufficient rights to delete this poll. Please talk to the server admin.'
                 ):
                     return False
 
                 # Delete Poll
                 result = await self.bot.db.polls.delete_one({'server_id': str(server.id), 'short': short})
+                if result.deleted_count == 0 and p.archive is not None:
+                    result = await self.bot.db.polls_archive.delete_one({'_id': p.id})
                 if result.deleted_count == 1:
+                    await self.bot.poll_index.forget_poll(server.id, short)
+                    await self.bot.garbage_collector.enqueue_poll(p.id)
+                    self.bot.poll_cache.invalidate(server.id, short)
                     say = f'Poll with label "{short}" was successfully deleted. This action can\'t be undone!'
                     title = 'Poll deleted'
                     await self.say_embed(ctx, say, title)
@@ -285,14 +267,13 @@ class PollControls(commands.Cog):
                 # Permission Check: Admin or Creator
                 if not await self.is_admin_or_creator(
                         ctx, server,
-                        p.author.id,
+                        p.author_id,
                         'You don\'t have sufficient rights to close this poll. Please talk to the server admin.'
                 ):
                     return False
 
                 # Close Poll
-                p.open = False
-                await p.save_to_db()
+                await p.close()
                 await ctx.invoke(self.show, short)
             else:
                 error = f'Poll with label "{short}" was not found. Listing all open polls.'
@@ -326,9 +307,46 @@ class PollControls(commands.Cog):
                 await self.say_error(ctx, error)
                 await ctx.invoke(self.show)
 
+    @commands.command()
+    async def recount(self, ctx, *, short=None):
+        """Recount the votes of a poll. Parameter: <label>"""
+        server = await ask_for_server(self.bot, ctx.message, short)
+        if not server:
+            return
+
+        if short is None:
+            pre = await get_server_pre(self.bot, ctx.message.guild)
+            error = f'Please specify the label of a poll after the recount command. \n' \
+                    f'`{pre}recount <poll_label>`'
+            await self.say_error(ctx, error)
+        else:
+            p = await Poll.load_from_db(self.bot, server.id, short)
+            if p is not None:
+                # Permission Check: Admin or Creator
+                if not await self.is_admin_or_creator(
+                        ctx, server,
+                        p.author_id,
+                        'You don\'t have sufficient rights to recount this poll. Please talk to the server admin.'
+                ):
+                    return False
+
+                # Rebuild the tally from the votes (the tally of archived polls is final)
+                if p.archive is None:
+                    await Tally.rebuild(self.bot, p.id)
+                await ctx.invoke(self.show, short)
+            else:
+                error = f'Poll with label "{short}" was not found.'
+                pre = await get_server_pre(self.bot, ctx.message.guild)
+                footer = f'Type {pre}show to display all polls'
+                await self.say_error(ctx, error, footer)
+
     @commands.command()
     async def export(self, ctx, *, short=None):
-        """Export a poll. Parameter: <label>"""
+        """Export a poll. Parameters: <label> <format> (optional: txt, csv or jsonl)"""
+        fmt = 'txt'
+        if short is not None and len(short.split()) > 1 and short.split()[-1].lower() in EXPORT_FORMATS:
+            fmt = short.split()[-1].lower()
+            short = ' '.join(short.split()[:-1])
         server = await ask_for_server(self.bot, ctx.message, short)
         if not server:
             return
@@ -336,7 +354,7 @@ class PollControls(commands.Cog):
         if short is None:
             pre = await get_server_pre(self.bot, ctx.message.guild)
             error = f'Please specify the label of a poll after the export command. \n' \
-                    f'`{pre}export <poll_label>`'
+                    f'`{pre}export <poll_label> <txt|csv|jsonl>`'
             await self.say_error(ctx, error)
         else:
             p = await Poll.load_from_db(self.bot, server.id, short)
@@ -348,7 +366,7 @@ class PollControls(commands.Cog):
                     await self.say_error(ctx, error_text)
                 else:
                     # sending file
-                    file_name = await p.export()
+                    file_name = await p.export(fmt)
                     if file_name is not None:
                         await ctx.message.author.send('Sending you the requested export of "{}".'.format(p.short),
                                                       file=discord.File(file_name)
@@ -380,17 +398,25 @@ class PollControls(commands.Cog):
         if short in ['open', 'closed', 'prepared']:
             query = None
             if short == 'open':
-                query = self.bot.db.polls.find({'server_id': str(server.id), 'open': True, 'active': True})
+                query = self.bot.db.polls.find({'server_id': str(server.id), 'open': True, 'active': True},
+                                                {'short': True, 'name': True})
             elif short == 'closed':
-                query = self.bot.db.polls.find({'server_id': str(server.id), 'open': False, 'active': True})
+                query = self.bot.db.polls.find({'server_id': str(server.id), 'open': False, 'active': True},
+                                                {'short': True, 'name': True})
             elif short == 'prepared':
-                query = self.bot.db.polls.find({'server_id': str(server.id), 'active': False})
+                query = self.bot.db.polls.find({'server_id': str(server.id), 'active': False},
+                                                {'short': True, 'name': True})
 
             if query is not None:
                 # sort by newest first
                 polls = [poll async for poll in query.sort('_id', -1)]
             else:
                 return
+            if short == 'closed':
+                # older closed polls are in the archive
+                query = self.bot.db.polls_archive.find({'server_id': str(server.id), 'open': False, 'active': True},
+                                                       {'short': True, 'name': True})
+                polls += [poll async for poll in query.sort('_id', -1)]
 
             def item_fct(i, item):
                 return f':black_small_square: **{item["short"]}**: {item["name"]}'
@@ -408,7 +434,7 @@ class PollControls(commands.Cog):
             p = await Poll.load_from_db(self.bot, server.id, short)
             if p is not None:
                 error_msg = 'This poll is inactive and you have no rights to display or view it.'
-                if not await p.is_active() and not await self.is_admin_or_creator(ctx, server, p.author, error_msg):
+                if not await p.is_active() and not await self.is_admin_or_creator(ctx, server, p.author_id, error_msg):
                     return
                 await p.post_embed(ctx)
             else:
@@ -441,7 +467,7 @@ class PollControls(commands.Cog):
                 await self.say_error(ctx, error)
                 return
             error = f'Insufficient permissions for this command.'
-            if not await self.is_admin_or_creator(ctx, server, p.author.id, error_msg=error):
+            if not await self.is_admin_or_creator(ctx, server, p.author_id, error_msg=error):
                 return
             try:
                 choice = ascii_lowercase.index(opt.lower())
@@ -454,16 +480,13 @@ class PollControls(commands.Cog):
             if p.open:
                 await ctx.invoke(self.close, short=short)
             await p.load_full_votes()
-            voter_list = []
-            for vote in p.full_votes:
-                if vote.choice == choice:
-                    voter_list.append(vote.user_id)
+            voter_list = p.full_votes.by_choice().get(choice)
             if not voter_list:
                 error = f'No votes for option "{opt}".'
                 await self.say_error(ctx, error)
                 return
             # print(voter_list)
-            winner_id = random.choice(voter_list)
+            winner_id = p.full_votes.user_ids[random.choice(voter_list)]
             # winner = server.get_member(int(winner_id))
             winner = await self.bot.member_cache.get(server, int(winner_id))
             if not winner:
@@ -497,7 +520,7 @@ class PollControls(commands.Cog):
                     'If the command string is invalid, you will get this error :)'
             parser = argparse.ArgumentParser(description=descr, formatter_class=CustomFormatter, add_help=False)
             parser.add_argument('-question', '-q')
-            parser.add_argument('-label', '-l', default=str(await generate_word(self.bot, server.id)))
+            parser.add_argument('-label', '-l')
             parser.add_argument('-anonymous', '-a', action="store_true")
             parser.add_argument('-options', '-o')
             parser.add_argument('-survey_flags', '-sf', default='0')
@@ -551,7 +574,10 @@ class PollControls(commands.Cog):
             # pass arguments to the wizard
             async def route(poll):
                 await poll.set_name(ctx, force=args.question)
-                await poll.set_short(ctx, force=args.label)
+                if args.label:
+                    await poll.set_short(ctx, force=args.label)
+                else:
+                    await poll.generate_short()
                 await poll.set_anonymous(ctx, force=f'{"yes" if args.anonymous else "no"}')
                 await poll.set_options_reaction(ctx, force=args.options)
                 await poll.set_survey_flags(ctx, force=args.survey_flags)
@@ -579,7 +605,7 @@ class PollControls(commands.Cog):
 
         async def route(poll):
             await poll.set_name(ctx, force=cmd)
-            await poll.set_short(ctx, force=str(await generate_word(self.bot, server.id)))
+            await poll.generate_short()
             await poll.set_anonymous(ctx, force='no')
             await poll.set_options_reaction(ctx)
             await poll.set_multiple_choice(ctx, force='1')
@@ -698,9 +724,81 @@ class PollControls(commands.Cog):
             return
 
         # Finalize
-        await poll.save_to_db()
+        while True:
+            try:
+                await poll.save_to_db()
+                break
+            except DuplicateInput:
+                # another poll took the label since the wizard checked it
+                poll.wizard_messages = []
+                try:
+                    await poll.set_short(ctx)
+                except StopWizard:
+                    return
+                finally:
+                    await poll.clean_up(ctx.channel)
         return poll
 
+    async def get_poll_reference(self, guild_id, channel_id, message_id, user_id):
+        """Find the poll shown in a message. Polls posted before the poll index existed are found by their label."""
+        ref = self.bot.poll_index.get(message_id)
+        if ref is not None:
+            return ref
+        if self.bot.poll_index.is_unknown(message_id):
+            return None
+        if self.bot.poll_index.is_loaded(guild_id):
+            # the index has every poll of the server that was posted since it was loaded
+            if self.bot.poll_index.is_new(guild_id, message_id):
+                return None
+        else:
+            ref = await self.bot.poll_index.lookup(message_id)
+            if ref is not None:
+                return ref
+
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            # discord rapidly closes dm channels by design
+            # put private channels back into the bots cache and try again
+            user = await self.bot.fetch_user(user_id)
+            await user.create_dm()
+            channel = self.bot.get_channel(channel_id)
+        if not isinstance(channel, (discord.TextChannel, discord.DMChannel)):
+            return None
+
+        message = self.bot.message_cache.get(message_id)
+        if message is None:
+            try:
+                message = await channel.fetch_message(id=message_id)
+            except (discord.errors.Forbidden, discord.errors.NotFound):
+                # Ignore Missing Access error
+                self.bot.poll_index.mark_unknown(message_id)
+                return None
+            self.bot.message_cache.put(message_id, message)
+        label = self.get_label(message)
+        server = None
+        if label:
+            if isinstance(channel, discord.TextChannel):
+                server = channel.guild
+            else:
+                server = await ask_for_server(self.bot, message, label)
+        # only the id of the poll is needed
+        p = await Poll.load_from_db(self.bot, server.id, label, fields=()) if server else None
+        if p is None:
+            self.bot.poll_index.mark_unknown(message_id)
+            return None
+        return await self.bot.poll_index.add(message, p)
+
+    async def get_poll_message(self, channel_id, message_id, user_id):
+        """Get a handle to the poll message without fetching it"""
+        message = self.bot.message_cache.get(message_id)
+        if message is not None:
+            return message
+        channel = self.bot.get_channel(channel_id)
+        if not channel:
+            user = await self.bot.fetch_user(user_id)
+            channel = await user.create_dm()
+        return PollMessage(self.bot, channel_id, message_id, channel)
+
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, data):
         # get emoji symbol
@@ -711,59 +809,24 @@ class PollControls(commands.Cog):
         # check if removed by the bot.. this is a bit hacky but discord doesn't provide the correct info...
         message_id = data.message_id
         user_id = data.user_id
-        if self.ignore_next_removed_reaction.get(str(message_id) + str(emoji)) == user_id:
-            del self.ignore_next_removed_reaction[str(message_id) + str(emoji)]
+        if self.bot.reaction_cleanup.is_ignored(message_id, emoji, user_id):
             return
 
-        # check if we can find a poll label
-        message_id = data.message_id
-        channel_id = data.channel_id
-        channel = self.bot.get_channel(channel_id)
-
-        if isinstance(channel, discord.TextChannel):
-            server = channel.guild
-            # user = server.get_member(user_id)
-            user = await self.bot.member_cache.get(server, user_id)
-            message = self.bot.message_cache.get(message_id)
-            if message is None:
-                message = await channel.fetch_message(id=message_id)
-                self.bot.message_cache.put(message_id, message)
-            label = self.get_label(message)
-            if not label:
-                return
-        elif isinstance(channel, discord.DMChannel):
-            user = await self.bot.fetch_user(user_id)  # only do this once
-            message = self.bot.message_cache.get(message_id)
-            if message is None:
-                message = await channel.fetch_message(id=message_id)
-                self.bot.message_cache.put(message_id, message)
-            label = self.get_label(message)
-            if not label:
-                return
-            server = await ask_for_server(self.bot, message, label)
-
-        elif not channel:
-            # discord rapidly closes dm channels by desing
-            # put private channels back into the bots cache and try again
-            user = await self.bot.fetch_user(user_id)  # only do this once
-            await user.create_dm()
-            channel = self.bot.get_channel(channel_id)
-            message = self.bot.message_cache.get(message_id)
-            if message is None:
-                message = await channel.fetch_message(id=message_id)
-                self.bot.message_cache.put(message_id, message)
-            label = self.get_label(message)
-            if not label:
-                return
-            server = await ask_for_server(self.bot, message, label)
-        else:
+        # check if the message shows a poll
+        ref = await self.get_poll_reference(data.guild_id, data.channel_id, message_id, user_id)
+        if ref is None:
+            return
+        server = self.bot.get_guild(int(ref.server_id))
+        if not server:
             return
 
-        p = await Poll.load_from_db(self.bot, server.id, label)
+        p = await Poll.load_from_db(self.bot, server.id, ref.short, fields=Poll.VOTE_FIELDS)
         if not isinstance(p, Poll):
             return
         if not p.anonymous:
             # for anonymous polls we can't unvote because we need to hide reactions
+            user = await self.bot.member_cache.get(server, user_id)
+            message = await self.get_poll_message(data.channel_id, message_id, user_id)
             await p.unvote(user, emoji.name, message)
 
     @commands.Cog.listener()
@@ -779,60 +842,27 @@ class PollControls(commands.Cog):
         #     emoji_name = emoji.name
         if not emoji:
             return
-        # check if we can find a poll label
-        message_id = data.message_id
-        channel_id = data.channel_id
-        channel = self.bot.get_channel(channel_id)
-        if isinstance(channel, discord.TextChannel):
-            server = channel.guild
-            # user = server.get_member(user_id)
-            message = self.bot.message_cache.get(message_id)
-            if message is None:
-                try:
-                    message = await channel.fetch_message(id=message_id)
-                except discord.errors.Forbidden:
-                    # Ignore Missing Access error
-                    return
-                self.bot.message_cache.put(message_id, message)
-            label = self.get_label(message)
-            if not label:
-                return
-        elif isinstance(channel, discord.DMChannel):
-            user = await self.bot.fetch_user(user_id)  # only do this once
-            message = self.bot.message_cache.get(message_id)
-            if message is None:
-                message = await channel.fetch_message(id=message_id)
-                self.bot.message_cache.put(message_id, message)
-            label = self.get_label(message)
-            if not label:
-                return
-            server = await ask_for_server(self.bot, message, label)
-        elif not channel:
-            # discord rapidly closes dm channels by design
-            # put private channels back into the bots cache and try again
-            user = await self.bot.fetch_user(user_id)  # only do this once
-            await user.create_dm()
-            channel = self.bot.get_channel(channel_id)
-            message = self.bot.message_cache.get(message_id)
-            if message is None:
-                message = await channel.fetch_message(id=message_id)
-                self.bot.message_cache.put(message_id, message)
-            label = self.get_label(message)
-            if not label:
-                return
-            server = await ask_for_server(self.bot, message, label)
-        else:
+
+        # check if the message shows a poll
+        ref = await self.get_poll_reference(data.guild_id, data.channel_id, data.message_id, user_id)
+        if ref is None:
+            return
+        server = self.bot.get_guild(int(ref.server_id))
+        if not server:
             return
 
-        p = await Poll.load_from_db(self.bot, server.id, label)
+        # info and export show the whole poll, votes only need the fields to check and count them
+        fields = None if emoji.name in ('📎', '❔') else Poll.VOTE_FIELDS
+        p = await Poll.load_from_db(self.bot, server.id, ref.short, fields=fields)
         if not isinstance(p, Poll):
             return
+        message = await self.get_poll_message(data.channel_id, data.message_id, user_id)
+        channel = message.channel
         # member = server.get_member(user_id)
-        user = member = data.member
+        user = member = data.member or await self.bot.member_cache.get(server, user_id)
         # export
         if emoji.name == '📎':
-            self.ignore_next_removed_reaction[str(message.id) + str(emoji)] = user_id
-            self.bot.loop.create_task(message.remove_reaction(emoji, member))  # remove reaction
+            self.bot.loop.create_task(self.bot.reaction_cleanup.remove(message, emoji, member))  # remove reaction
 
             # sending file
             file_name = await p.export()
@@ -846,15 +876,14 @@ class PollControls(commands.Cog):
         # info
 
         elif emoji.name == '❔':
-            self.ignore_next_removed_reaction[str(message.id) + str(emoji)] = user_id
-            self.bot.loop.create_task(message.remove_reaction(emoji, member))  # remove reaction
+            self.bot.loop.create_task(self.bot.reaction_cleanup.remove(message, emoji, member))  # remove reaction
             is_open = await p.is_open()
             embed = discord.Embed(title=f"Info for the {'CLOSED ' if not is_open else ''}poll \"{p.short}\"",
                                   description='', color=SETTINGS.color)
             embed.set_author(name=f" >> {p.short}", icon_url=SETTINGS.author_icon)
 
             # created by
-            created_by = await self.bot.member_cache.get(server, int(p.author.id))
+            created_by = await p.get_author()
             # created_by = server.get_member(int(p.author.id))
             embed.add_field(name=f'Created by:', value=f'{created_by if created_by else "<Deleted User>"}',
                             inline=False)
@@ -866,7 +895,7 @@ class PollControls(commands.Cog):
 
             # edit rights
             edit_rights = False
-            if str(member.id) == str(p.author.id):
+            if str(member.id) == str(p.author_id):
                 edit_rights = True
             elif member.guild_permissions.manage_guild:
                 edit_rights = True
@@ -909,11 +938,15 @@ class PollControls(commands.Cog):
             embed.add_field(name='Time left in the poll:', value=time_left, inline=False)
             await user.send(embed=embed)
 
-            await p.load_full_votes()
-            # await p.load_vote_counts()
-            await p.load_unique_participants()
+            # the votes are only needed to list them
+            show_votes = not p.anonymous
+            show_answers = (not p.open or not p.hide_count) and p.anonymous and len(p.survey_flags) > 0
+            votes_by_choice = {}
+            if show_votes or show_answers:
+                await p.load_full_votes()
+                votes_by_choice = p.full_votes.by_choice()
             # send current details of who currently voted for what
-            if not p.anonymous and len(p.full_votes) > 0:
+            if show_votes and votes_by_choice:
                 msg = '--------------------------------------------\n' \
                       'VOTES\n' \
                       '--------------------------------------------\n'
@@ -923,10 +956,11 @@ class PollControls(commands.Cog):
                             msg += AZ_EMOJIS[i] + " "
                         msg += "**" + o + ":**"
                     c = 0
-                    for vote in p.full_votes:
+                    for row in votes_by_choice.get(i, []):
+                        user_id, _, _, answer = p.full_votes.get(row)
                         # member = server.get_member(int(vote.user_id))
-                        member: discord.Member = await self.bot.member_cache.get(server, int(vote.user_id))
-                        if not member or vote.choice != i:
+                        member: discord.Member = await self.bot.member_cache.get(server, user_id)
+                        if not member:
                             continue
                         c += 1
                         name = member.display_name
@@ -936,7 +970,7 @@ class PollControls(commands.Cog):
                             name = "<Deleted User>"
                         msg += f'\n{name}'
                         if i in p.survey_flags:
-                            msg += f': {vote.answer}'
+                            msg += f': {answer}'
                         if len(msg) > 1500:
                             await user.send(msg)
                             msg = ''
@@ -947,7 +981,7 @@ class PollControls(commands.Cog):
 
                 if len(msg) > 0:
                     await user.send(msg)
-            elif (not p.open or not p.hide_count) and p.anonymous and len(p.survey_flags) > 0 and len(p.full_votes) > 0:
+            elif show_answers and votes_by_choice:
                 msg = '--------------------------------------------\n' \
                       'Custom Answers (Anonymous)\n' \
                       '--------------------------------------------\n'
@@ -956,10 +990,9 @@ class PollControls(commands.Cog):
                     if i not in p.survey_flags:
                         continue
                     custom_answers = ''
-                    for vote in p.full_votes:
-                        if vote.choice == i:
-                            has_answers = True
-                            custom_answers += f'\n{vote.answer}'
+                    for row in votes_by_choice.get(i, []):
+                        has_answers = True
+                        custom_answers += f'\n{p.full_votes.answers.get(row, "")}'
                     if len(custom_answers) > 0:
                         if not p.options_reaction_emoji_only:
                             msg += AZ_EMOJIS[i] + " "
@@ -983,18 +1016,11 @@ class PollControls(commands.Cog):
 
             # check if we need to remove reactions (this will trigger on_reaction_remove)
             if not isinstance(channel, discord.DMChannel) and (p.anonymous or p.hide_count):
-                # immediately remove reaction and to be safe, remove all reactions
-                self.ignore_next_removed_reaction[str(message.id) + str(emoji)] = user_id
-                await message.remove_reaction(emoji, user)
+                # immediately remove reaction and to be safe, sweep all reactions soon
+                await self.bot.reaction_cleanup.remove(message, emoji, user)
 
                 # clean up all reactions (prevent lingering reactions)
-                for rct in message.reactions:
-                    if rct.count > 1:
-                        async for user in rct.users():
-                            if user == self.bot.user:
-                                continue
-                            self.ignore_next_removed_reaction[str(message.id) + str(rct.emoji)] = user_id
-                            self.bot.loop.create_task(rct.remove(user))
+                self.bot.reaction_cleanup.schedule(message)
 
             # order here is crucial since we can't determine if a reaction was removed by the bot or user
             # update database with vote
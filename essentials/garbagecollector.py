@@ -0,0 +1,136 @@
+import asyncio
+import datetime
+import logging
+from collections import defaultdict
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger('discord')
+
+
+class GarbageCollector:
+    """Deletes the data that belongs to deleted polls and to servers the bot has left.
+    Work is queued in the gc_queue collection and done in batches of batch_size documents with a pause in between,
+    so a large poll doesn't block the database. Servers are only cleaned up grace seconds after the bot left them."""
+
+    def __init__(self, _bot, batch_size=500, pause=1, grace=7 * 24 * 3600):
+        self._bot = _bot
+        self._batch_size = batch_size
+        self._pause = pause
+        self._grace = grace
+        self._avg_sizes = {}
+        self.deleted = defaultdict(int)
+        self.reclaimed_bytes = defaultdict(int)
+        self.polls = 0
+        self.guilds = 0
+
+    async def enqueue_poll(self, poll_id):
+        await self._bot.db.gc_queue.insert_one(
+            {'kind': 'poll', 'poll_id': poll_id, 'due': datetime.datetime.utcnow()}
+        )
+
+    async def enqueue_guild(self, server_id):
+        await self._bot.db.gc_queue.update_one(
+            {'kind': 'guild', 'server_id': str(server_id)},
+            {'$set': {'due': datetime.datetime.utcnow() + datetime.timedelta(seconds=self._grace)}},
+            upsert=True
+        )
+
+    async def cancel_guild(self, server_id):
+        """The bot was added to the server again before its data was deleted"""
+        await self._bot.db.gc_queue.delete_one({'kind': 'guild', 'server_id': str(server_id)})
+
+    async def collect(self, limit=10):
+        """Work off the due entries of the queue. Returns the number of entries done."""
+        done = 0
+        for _ in range(limit):
+            now = datetime.datetime.utcnow()
+            # claim the entry for an hour, so other clusters skip it
+            entry = await self._bot.db.gc_queue.find_one_and_update(
+                {'due': {'$lte': now}},
+                {'$set': {'due': now + datetime.timedelta(hours=1)}},
+                sort=[('due', 1)],
+                return_document=ReturnDocument.AFTER
+            )
+            if entry is None:
+                break
+            if entry['kind'] == 'poll':
+                await self.collect_poll(entry['poll_id'])
+            elif entry['kind'] == 'guild':
+                await self.collect_guild(entry['server_id'])
+            await self._bot.db.gc_queue.delete_one({'_id': entry['_id']})
+            done += 1
+        return done
+
+    async def collect_poll(self, poll_id):
+        await self._delete_batched('ballots', {'poll_id': poll_id})
+        await self._delete_batched('votes', {'poll_id': poll_id})
+        await self._delete_batched('tallies', {'_id': poll_id})
+        # the in-memory state of this cluster, other clusters let theirs expire
+        self._bot.poll_cache.invalidate(poll_id=poll_id)
+        self._bot.refresh_scheduler.forget_poll(poll_id)
+        self._bot.vote_buffer.forget_poll(poll_id)
+        self.polls += 1
+
+    async def collect_guild(self, server_id):
+        server_id = str(server_id)
+        for collection in ('polls', 'polls_archive'):
+            while True:
+                polls = await self._bot.db[collection].find(
+                    {'server_id': server_id}, {'_id': True, 'short': True}).limit(self._batch_size).to_list(None)
+                if not polls:
+                    break
+                for d in polls:
+                    await self.collect_poll(d['_id'])
+                    await self._bot.poll_index.forget_poll(server_id, d.get('short'))
+                await self._delete(collection, {'_id': {'$in': [d['_id'] for d in polls]}})
+        await self._delete_batched('poll_messages', {'server_id': server_id})
+        await self._delete('config', {'_id': server_id})
+        self.guilds += 1
+
+    async def scan(self):
+        """Queue the polls that have votes but don't exist anymore (deleted before the collector existed)"""
+        found = 0
+        async for d in self._bot.db.ballots.aggregate([{"$group": {"_id": "$poll_id"}}], allowDiskUse=True):
+            poll_id = d['_id']
+            if await self._bot.db.polls.count_documents({'_id': poll_id}, limit=1) \
+                    or await self._bot.db.polls_archive.count_documents({'_id': poll_id}, limit=1):
+                continue
+            await self.enqueue_poll(poll_id)
+            found += 1
+        return found
+
+    async def _delete_batched(self, collection, query):
+        while True:
+            ids = [d['_id'] async for d in self._bot.db[collection].find(query, {'_id': True}).limit(self._batch_size)]
+            if not ids:
+                return
+            await self._delete(collection, {'_id': {'$in': ids}})
+            if len(ids) < self._batch_size:
+                return
+            await asyncio.sleep(self._pause)
+
+    async def _delete(self, collection, query):
+        result = await self._bot.db[collection].delete_many(query)
+        if result.deleted_count:
+            self.deleted[collection] += result.deleted_count
+            self.reclaimed_bytes[collection] += result.deleted_count * await self._get_avg_size(collection)
+
+    async def _get_avg_size(self, collection):
+        if collection not in self._avg_sizes:
+            try:
+                stats = await self._bot.db.command('collStats', collection)
+                self._avg_sizes[collection] = stats.get('avgObjSize', 0)
+            except Exception as e:
+                logger.warning(f'Could not get the stats of {collection}: {e}')
+                self._avg_sizes[collection] = 0
+        return self._avg_sizes[collection]
+
+    def stats(self):
+        return {
+            'polls': self.polls,
+            'guilds': self.guilds,
+            'documents': sum(self.deleted.values()),
+            'bytes': sum(self.reclaimed_bytes.values()),
+            **{f'{c} documents': n for c, n in self.deleted.items()}
+        }
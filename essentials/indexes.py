@@ -0,0 +1,94 @@
+import datetime
+import logging
+
+from bson import ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger('discord')
+
+# collection -> list of (keys, options)
+INDEXES = {
+    'polls': [
+        ([('server_id', ASCENDING), ('short', ASCENDING)], {'unique': True}),
+        ([('server_id', ASCENDING), ('open', ASCENDING), ('active', ASCENDING)], {}),
+        ([('open', ASCENDING), ('duration', ASCENDING)], {}),
+        ([('open', ASCENDING), ('closed_at', ASCENDING)], {}),
+        ([('active', ASCENDING), ('activation', ASCENDING)], {}),
+        ([('short', ASCENDING)], {}),
+    ],
+    'ballots': [
+        # Vote.commit relies on one ballot per poll and user
+        ([('poll_id', ASCENDING), ('user_id', ASCENDING)], {'unique': True}),
+    ],
+    'votes': [
+        # legacy votes (before 2.6) of a poll, until the migrations have moved them into the ballots
+        ([('poll_id', ASCENDING), ('user_id', ASCENDING)], {}),
+    ],
+    'polls_archive': [
+        ([('server_id', ASCENDING), ('short', ASCENDING)], {}),
+    ],
+    'gc_queue': [
+        ([('due', ASCENDING)], {}),
+    ],
+    'poll_messages': [
+        ([('server_id', ASCENDING), ('short', ASCENDING)], {}),
+    ],
+}
+
+
+def get_canonical_queries():
+    """The queries of the hot paths: (name, collection, filter)"""
+    now = datetime.datetime.utcnow()
+    poll_id = ObjectId()
+    return [
+        ('poll by label', 'polls', {'server_id': '0', 'short': 'x'}),
+        ('polls of a server', 'polls', {'server_id': '0', 'open': True, 'active': True}),
+        ('polls by label', 'polls', {'short': 'x'}),
+        ('polls to close', 'polls', {'open': True, 'duration': {'$gte': now, '$lte': now}}),
+        ('polls to activate', 'polls', {'active': False, 'activation': {'$gte': now, '$lte': now}}),
+        ('polls to archive', 'polls', {'open': False, 'closed_at': {'$lt': now}}),
+        ('ballot', 'ballots', {'poll_id': poll_id, 'user_id': '0'}),
+        ('vote', 'ballots', {'poll_id': poll_id, 'user_id': '0', 'choices': 0}),
+        ('ballots of a poll', 'ballots', {'poll_id': poll_id}),
+        ('ballots for a choice', 'ballots', {'poll_id': poll_id, 'mask': {'$bitsAnySet': [0]}}),
+        ('legacy votes of a poll', 'votes', {'poll_id': poll_id}),
+        ('archived poll by label', 'polls_archive', {'server_id': '0', 'short': 'x'}),
+        ('tally', 'tallies', {'_id': poll_id}),
+        ('config', 'config', {'_id': '0'}),
+        ('poll messages of servers', 'poll_messages', {'server_id': {'$in': ['0']}}),
+        ('poll messages of a poll', 'poll_messages', {'server_id': '0', 'short': 'x'}),
+    ]
+
+
+async def ensure_indexes(db):
+    """Create the indexes of the hot queries. Existing indexes are left untouched, so this is cheap to run on
+    every start. A unique index that can't be built raises, the bot relies on it to keep the data consistent."""
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                await db[collection].create_index(keys, **options)
+            except OperationFailure as e:
+                # e.g. duplicates in existing data prevent a unique index
+                logger.error(f'Could not create index {keys} on {collection}: {e}')
+                if options.get('unique'):
+                    raise
+
+
+def _get_stages(plan):
+    stages = [plan.get('stage')]
+    if 'inputStage' in plan:
+        stages += _get_stages(plan['inputStage'])
+    for p in plan.get('inputStages', []):
+        stages += _get_stages(p)
+    return stages
+
+
+async def audit_indexes(db):
+    """Explain every canonical query. Returns a list of (name, collection, stages) for the winning plans."""
+    report = []
+    for name, collection, query in get_canonical_queries():
+        explain = await db[collection].find(query).explain()
+        plan = explain.get('queryPlanner', {}).get('winningPlan', {})
+        report.append((name, collection, _get_stages(plan)))
+    return report
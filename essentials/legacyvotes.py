@@ -0,0 +1,58 @@
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+
+from migrations.build_ballots import MergeLegacyVotes, mark_tallies_stale
+
+logger = logging.getLogger('discord')
+
+
+class LegacyVotes:
+    """Reads through to the votes table of versions before 2.6 until the migrations have moved it into the ballots.
+    The first time a poll's votes are used, its legacy votes are merged into its ballots the same way the migration
+    does it. Polls that are done are remembered, and once the votes table is empty nothing is checked at all."""
+
+    def __init__(self, _bot, size=10000):
+        self._bot = _bot
+        self._size = size
+        self._done = OrderedDict()
+        self._locks = weakref.WeakValueDictionary()
+        self.enabled = True
+        self.polls = 0
+        self.votes = 0
+
+    async def check(self):
+        """Called on start, turns the read-through off if there are no legacy votes"""
+        self.enabled = await self._bot.db.votes.estimated_document_count() > 0
+
+    async def upgrade(self, poll_id):
+        if not self.enabled or poll_id in self._done:
+            return
+        lock = self._locks.get(poll_id)
+        if lock is None:
+            lock = self._locks[poll_id] = asyncio.Lock()
+        async with lock:
+            if poll_id in self._done:
+                return
+            votes = await self._bot.db.votes.find({'poll_id': poll_id}, MergeLegacyVotes.projection) \
+                .sort('_id', 1).to_list(None)
+            if votes:
+                merge = MergeLegacyVotes()
+                operations = [op for d in votes for op in merge.get_operations(d)]
+                await self._bot.db.ballots.bulk_write(operations, ordered=True)
+                await self._bot.db.votes.delete_many({'_id': {'$in': [d['_id'] for d in votes]}})
+                await mark_tallies_stale(self._bot.db, [poll_id])
+                self.polls += 1
+                self.votes += len(votes)
+                logger.info(f'Merged {len(votes)} legacy votes of poll {poll_id} into its ballots.')
+            self._done[poll_id] = True
+            while len(self._done) > self._size:
+                self._done.popitem(last=False)
+
+    def stats(self):
+        return {
+            'enabled': self.enabled,
+            'polls': self.polls,
+            'votes': self.votes
+        }
@@ -1,5 +1,7 @@
+import asyncio
 import logging
-from collections import defaultdict
+import time
+from collections import OrderedDict
 
 import discord
 
@@ -7,21 +9,103 @@ logger = logging.getLogger('discord')
 
 
 class MemberCache:
-    def __init__(self):
-        self._cache_dict = defaultdict(dict)
+    """Bounded per-guild LRU cache of members. Entries expire after ttl seconds.
+    Users that are not members (anymore) are cached as None for negative_ttl seconds.
+    Concurrent lookups of the same uncached member share one fetch."""
 
-    async def add(self, guild: discord.Guild, member_id: int) -> discord.Member:
-        member = await guild.fetch_member(member_id)
-        self._cache_dict[guild.id][member_id] = member
-        if len(self._cache_dict[guild.id]) % 1 == 0:
-            logger.info("member cache size: " + str(len(self._cache_dict[guild.id])))
+    def __init__(self, size=1000, ttl=3600, negative_ttl=600):
+        self._size = size
+        self._ttl = ttl
+        self._negative_ttl = negative_ttl
+        self._cache_dict = {}
+        self._inflight = {}
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.fetches = 0
+        self.shared_fetches = 0
+        self.evictions = 0
+
+    def _store(self, guild_id, member_id, member):
+        guild_cache = self._cache_dict.setdefault(guild_id, OrderedDict())
+        ttl = self._ttl if member is not None else self._negative_ttl
+        guild_cache[member_id] = (time.monotonic() + ttl, member)
+        guild_cache.move_to_end(member_id)
+        while len(guild_cache) > self._size:
+            guild_cache.popitem(last=False)
+            self.evictions += 1
+
+    async def _fetch(self, guild: discord.Guild, member_id: int):
+        self.fetches += 1
+        try:
+            member = await guild.fetch_member(member_id)
+        except discord.NotFound:
+            member = None
+        self._store(guild.id, member_id, member)
         return member
 
+    async def add(self, guild: discord.Guild, member_id: int) -> discord.Member:
+        key = (guild.id, member_id)
+        task = self._inflight.get(key, None)
+        if task is None:
+            task = asyncio.ensure_future(self._fetch(guild, member_id))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared_fetches += 1
+        return await asyncio.shield(task)
+
     async def get(self, guild: discord.Guild, member_id: int) -> discord.Member:
-        member = self._cache_dict[guild.id].get(member_id, None)
-        if not member:
-            member = await self.add(guild, member_id)
-        return member
+        guild_cache = self._cache_dict.get(guild.id, None)
+        entry = guild_cache.get(member_id, None) if guild_cache else None
+        if entry is not None:
+            expires, member = entry
+            if expires >= time.monotonic():
+                guild_cache.move_to_end(member_id)
+                if member is None:
+                    self.negative_hits += 1
+                else:
+                    self.hits += 1
+                return member
+            del guild_cache[member_id]
+
+        # members in the gateway cache don't need a request
+        member = guild.get_member(member_id)
+        if member is not None:
+            self.hits += 1
+            self._store(guild.id, member_id, member)
+            return member
+
+        self.misses += 1
+        return await self.add(guild, member_id)
+
+    def update(self, member: discord.Member):
+        """Replace a cached member with a newer version (e.g. from on_member_update)"""
+        guild_cache = self._cache_dict.get(member.guild.id, None)
+        if guild_cache and member.id in guild_cache:
+            self._store(member.guild.id, member.id, member)
+
+    def remove(self, guild_id, member_id):
+        """Remember a member that left the guild"""
+        self._store(guild_id, member_id, None)
+
+    def forget_guild(self, guild_id):
+        """Drop the members of a guild the bot left"""
+        self._cache_dict.pop(guild_id, None)
+
+    def stats(self):
+        total = self.hits + self.negative_hits + self.misses
+        return {
+            'guilds': len(self._cache_dict),
+            'size': sum(len(c) for c in self._cache_dict.values()),
+            'hits': self.hits,
+            'negative hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.negative_hits) / total, 3) if total else 0,
+            'fetches': self.fetches,
+            'shared fetches': self.shared_fetches,
+            'evictions': self.evictions
+        }
 
     def clear(self):
-        self._cache_dict = defaultdict(dict)
\ No newline at end of file
+        self._cache_dict = {}
@@ -1,27 +1,86 @@
 import logging
+import time
+from collections import OrderedDict
+
 import discord
 
 logger = logging.getLogger('discord')
 
 
 class MessageCache:
-    def __init__(self, _bot):
+    """Bounded LRU cache of fetched messages. Entries expire after ttl seconds.
+    Misses fall back to the bot's own message store, which is indexed by id incrementally.
+    The index is kept in the order of the store, so it only ever holds messages that are still in the store."""
+
+    def __init__(self, _bot, size=1000, ttl=3600):
         self._bot = _bot
-        self._cache_dict = {}
+        self._size = size
+        self._ttl = ttl
+        self._cache_dict = OrderedDict()
+        self._store_index = OrderedDict()
+        self.hits = 0
+        self.store_hits = 0
+        self.misses = 0
+        self.evictions = 0
 
     def put(self, key, value: discord.Message):
-        self._cache_dict[key] = value
-        if self._cache_dict.__len__() % 5 == 0:
-            logger.info("cache size: " + str(self._cache_dict.__len__()))
+        self._cache_dict[key] = (time.monotonic() + self._ttl, value)
+        self._cache_dict.move_to_end(key)
+        while len(self._cache_dict) > self._size:
+            self._cache_dict.popitem(last=False)
+            self.evictions += 1
 
     def get(self, key):
         # Try to find it in this cache, then see if it is cached in the bots own message cache
-        message = self._cache_dict.get(key, None)
-        if message == None:
-            for m in self._bot._connection._messages:
-                if m.id == key:
-                    return m
+        entry = self._cache_dict.get(key, None)
+        if entry is not None:
+            expires, message = entry
+            if expires >= time.monotonic():
+                self._cache_dict.move_to_end(key)
+                self.hits += 1
+                return message
+            del self._cache_dict[key]
+        message = self._get_from_store(key)
+        if message is None:
+            self.misses += 1
+        else:
+            self.store_hits += 1
         return message
 
+    def _get_from_store(self, key):
+        messages = getattr(self._bot._connection, '_messages', None)
+        if not messages:
+            self._store_index = OrderedDict()
+            return None
+        # new messages are appended on the right, index everything after the newest indexed message
+        new_messages = []
+        for m in reversed(messages):
+            if m.id in self._store_index:
+                break
+            new_messages.append(m)
+        for m in reversed(new_messages):
+            self._store_index[m.id] = m
+        # old messages leave the store on the left, drop them from the index as well
+        oldest = messages[0].id
+        while self._store_index and next(iter(self._store_index)) != oldest:
+            self._store_index.popitem(last=False)
+        if len(self._store_index) != len(messages):
+            # a message was removed from the middle of the store (e.g. it was deleted)
+            self._store_index = OrderedDict((m.id, m) for m in messages)
+        return self._store_index.get(key, None)
+
+    def stats(self):
+        total = self.hits + self.store_hits + self.misses
+        return {
+            'size': len(self._cache_dict),
+            'store index size': len(self._store_index),
+            'hits': self.hits,
+            'store hits': self.store_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.hits + self.store_hits) / total, 3) if total else 0,
+            'evictions': self.evictions
+        }
+
     def clear(self):
-        self._cache_dict = {}
\ No newline at end of file
+        self._cache_dict = OrderedDict()
+        self._store_index = OrderedDict()
@@ -49,7 +49,7 @@ async def get_servers(bot, message, short=None):
             if message.author.id in [m.id for m in s.members]:
                 list_of_shared_servers.append(s)
         if short is not None:
-            query = bot.db.polls.find({'short': short})
+            query = bot.db.polls.find({'short': short}, {'server_id': True})
             if query is not None:
                 server_ids_with_short = [poll['server_id'] async for poll in query]
                 servers_with_short = [bot.get_guild(x) for x in server_ids_with_short]
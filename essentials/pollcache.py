@@ -0,0 +1,90 @@
+import logging
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('discord')
+
+
+class PollCache:
+    """LRU cache of hydrated polls, keyed by (server_id, short). Entries can also be invalidated by the poll _id.
+    Entries expire after ttl seconds because other clusters can change a poll (e.g. commands sent by DM).
+    Handing out copies keeps the vote data of concurrent reactions apart.
+    Polls loaded with a projection are cached as well, they are handed out to loads of the same or fewer fields."""
+
+    def __init__(self, size=1000, ttl=60):
+        self._size = size
+        self._ttl = ttl
+        self._cache_dict = OrderedDict()
+        self._ids = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def _get(self, key, fields=None):
+        entry = self._cache_dict.get(key, None)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires, poll = entry
+        if expires < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        if poll.fields is not None and (fields is None or not poll.fields.issuperset(fields)):
+            self.misses += 1
+            return None
+        self._cache_dict.move_to_end(key)
+        self.hits += 1
+        return poll.copy()
+
+    def get(self, server_id, short, fields=None):
+        """A cached poll with at least the given fields, all fields if there are none"""
+        return self._get((str(server_id), short), fields)
+
+    def put(self, poll):
+        if poll.server is None:
+            return
+        key = (str(poll.server.id), poll.short)
+        entry = self._cache_dict.get(key, None)
+        if entry is not None and poll.fields is not None and entry[0] >= time.monotonic() \
+                and (entry[1].fields is None or entry[1].fields.issuperset(poll.fields)):
+            # keep the entry that has more fields
+            return
+        self._cache_dict[key] = (time.monotonic() + self._ttl, poll.copy())
+        self._cache_dict.move_to_end(key)
+        if poll.id is not None:
+            self._ids[poll.id] = key
+        while len(self._cache_dict) > self._size:
+            _, (_, old_poll) = self._cache_dict.popitem(last=False)
+            self._ids.pop(old_poll.id, None)
+            self.evictions += 1
+
+    def invalidate(self, server_id=None, short=None, poll_id=None):
+        key = None
+        if server_id is not None and short is not None:
+            key = (str(server_id), short)
+        elif poll_id is not None:
+            key = self._ids.get(poll_id, None)
+        if key is not None and key in self._cache_dict:
+            self._remove(key)
+            self.invalidations += 1
+
+    def _remove(self, key):
+        _, poll = self._cache_dict.pop(key)
+        self._ids.pop(poll.id, None)
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'size': len(self._cache_dict),
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / total, 3) if total else 0,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations
+        }
+
+    def clear(self):
+        self._cache_dict = OrderedDict()
+        self._ids = {}
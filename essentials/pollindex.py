@@ -0,0 +1,120 @@
+import datetime
+import logging
+from collections import OrderedDict, namedtuple
+
+import discord
+
+logger = logging.getLogger('discord')
+
+PollRef = namedtuple('PollRef', ['server_id', 'short', 'poll_id', 'channel_id'])
+
+
+class PollMessage:
+    """Stand-in for a posted poll message that was not fetched from discord.
+    Supports the parts of discord.Message the poll controls use, by talking to the http routes directly."""
+
+    def __init__(self, _bot, channel_id, message_id, channel=None):
+        self._bot = _bot
+        self.id = message_id
+        self.channel_id = channel_id
+        self.channel = channel
+
+    @property
+    def guild(self):
+        return getattr(self.channel, 'guild', None)
+
+    async def edit(self, embed=None):
+        await self._bot.http.edit_message(self.channel_id, self.id, embed=embed.to_dict() if embed else None)
+
+    async def add_reaction(self, emoji):
+        await self._bot.http.add_reaction(self.channel_id, self.id, discord.Message._emoji_reaction(emoji))
+
+    async def remove_reaction(self, emoji, member):
+        emoji = discord.Message._emoji_reaction(emoji)
+        if member.id == self._bot.user.id:
+            await self._bot.http.remove_own_reaction(self.channel_id, self.id, emoji)
+        else:
+            await self._bot.http.remove_reaction(self.channel_id, self.id, emoji, member.id)
+
+    async def clear_reactions(self):
+        await self._bot.http.clear_reactions(self.channel_id, self.id)
+
+
+class PollIndex:
+    """Maps the ids of posted poll messages to the poll they display.
+    The index is persisted in the poll_messages collection and the entries for the servers of this cluster are kept
+    in memory, so reactions can be resolved without fetching the message or reading its embed.
+    Every poll this cluster posts on a loaded server is added when it is posted, so a message of a loaded server
+    that is newer than the load and not in the index doesn't show a poll.
+    The index isn't bounded for that reason: an evicted entry would turn a poll into an unknown message. It holds one
+    small entry per posted poll message, and the entries of a poll are dropped when the poll is deleted or collected."""
+
+    def __init__(self, _bot, unknown_size=10000):
+        self._bot = _bot
+        self._index = {}
+        # server_id -> time its entries were loaded
+        self._loaded = {}
+        self._unknown = OrderedDict()
+        self._unknown_size = unknown_size
+
+    async def load(self, server_ids):
+        # messages posted while the entries are read are added to the index as well
+        loaded_at = datetime.datetime.utcnow()
+        server_ids = [str(s) for s in server_ids]
+        query = self._bot.db.poll_messages.find({'server_id': {'$in': server_ids}})
+        async for d in query:
+            self._index[d['_id']] = PollRef(d['server_id'], d['short'], d.get('poll_id'), d.get('channel_id'))
+        for server_id in server_ids:
+            self._loaded[server_id] = loaded_at
+        logger.info("poll index size: " + str(len(self._index)))
+
+    def is_loaded(self, server_id):
+        return server_id is not None and str(server_id) in self._loaded
+
+    def is_new(self, server_id, message_id):
+        """Whether a message was posted after the entries of its (loaded) server were loaded.
+        If it showed a poll, it would be in the index."""
+        return discord.utils.snowflake_time(message_id) > self._loaded[str(server_id)]
+
+    def get(self, message_id):
+        return self._index.get(message_id, None)
+
+    def is_unknown(self, message_id):
+        return message_id in self._unknown
+
+    def mark_unknown(self, message_id):
+        """Remember a message that doesn't show a poll, so further reactions on it are ignored right away"""
+        self._unknown[message_id] = True
+        self._unknown.move_to_end(message_id)
+        if len(self._unknown) > self._unknown_size:
+            self._unknown.popitem(last=False)
+
+    async def lookup(self, message_id):
+        """Get an entry that is not in memory (e.g. a poll posted by another cluster). Not needed for loaded servers."""
+        d = await self._bot.db.poll_messages.find_one({'_id': message_id})
+        if d is None:
+            return None
+        ref = PollRef(d['server_id'], d['short'], d.get('poll_id'), d.get('channel_id'))
+        self._index[message_id] = ref
+        return ref
+
+    async def add(self, message, poll):
+        ref = PollRef(str(poll.server.id), poll.short, poll.id, message.channel.id)
+        self._index[message.id] = ref
+        self._unknown.pop(message.id, None)
+        await self._bot.db.poll_messages.update_one(
+            {'_id': message.id},
+            {'$set': {'server_id': ref.server_id, 'short': ref.short, 'poll_id': ref.poll_id,
+                      'channel_id': ref.channel_id}},
+            upsert=True
+        )
+        return ref
+
+    async def forget_poll(self, server_id, short):
+        server_id = str(server_id)
+        for message_id in [k for k, v in self._index.items() if v.server_id == server_id and v.short == short]:
+            del self._index[message_id]
+        await self._bot.db.poll_messages.delete_many({'server_id': server_id, 'short': short})
+
+    def __len__(self):
+        return len(self._index)
@@ -0,0 +1,91 @@
+import logging
+import time
+from collections import OrderedDict
+
+import discord
+
+logger = logging.getLogger('discord')
+
+
+class ReactionCleanup:
+    """Removes the reactions of users from poll messages that must not show them (anonymous and hidden-count polls).
+    The reaction that triggered a vote is removed right away. Lingering reactions are swept by one worker per
+    message, at most once every window seconds, no matter how many votes come in meanwhile.
+    Reactions removed by the bot are remembered for ttl seconds, so the resulting remove events can be ignored."""
+
+    def __init__(self, _bot, window=5, ttl=60, size=10000):
+        self._bot = _bot
+        self._window = window
+        self._ttl = ttl
+        self._size = size
+        self._ignored = OrderedDict()
+        # message id -> timer of the next sweep
+        self._timers = {}
+        self._last_sweep = {}
+        self.removed = 0
+        self.sweeps = 0
+        self.skipped_sweeps = 0
+
+    def ignore(self, message_id, emoji, user_id):
+        key = (message_id, str(emoji), user_id)
+        self._ignored[key] = time.monotonic() + self._ttl
+        self._ignored.move_to_end(key)
+        while len(self._ignored) > self._size:
+            self._ignored.popitem(last=False)
+
+    def is_ignored(self, message_id, emoji, user_id):
+        """Check (once) if a removed reaction was removed by the bot"""
+        expires = self._ignored.pop((message_id, str(emoji), user_id), None)
+        return expires is not None and expires >= time.monotonic()
+
+    async def remove(self, message, emoji, member):
+        self.ignore(message.id, emoji, member.id)
+        try:
+            await message.remove_reaction(emoji, member)
+            self.removed += 1
+        except discord.HTTPException as e:
+            logger.warning(f'Could not remove reaction {emoji} from message {message.id}: {e}')
+
+    def schedule(self, message):
+        """Sweep the reactions of a message within the next window"""
+        if message.id in self._timers:
+            self.skipped_sweeps += 1
+            return
+        since_last = time.monotonic() - self._last_sweep.get(message.id, 0)
+        delay = max(0, self._window - since_last)
+        self._timers[message.id] = self._bot.loop.call_later(
+            delay, lambda: self._bot.loop.create_task(self._sweep(message))
+        )
+
+    async def _sweep(self, message):
+        self._last_sweep[message.id] = time.monotonic()
+        try:
+            # the reactions of cached messages may be stale, always get the current state
+            full_message = await message.channel.fetch_message(message.id)
+            for rct in full_message.reactions:
+                if rct.count <= (1 if rct.me else 0):
+                    continue
+                async for user in rct.users():
+                    if user.id == self._bot.user.id:
+                        continue
+                    # one at a time, so the http client can keep to the rate limit of the route
+                    await self.remove(full_message, rct.emoji, user)
+            self.sweeps += 1
+        except discord.HTTPException as e:
+            logger.warning(f'Could not clean up the reactions of message {message.id}: {e}')
+        finally:
+            del self._timers[message.id]
+            # forget sweeps that can't delay the next one anymore
+            now = time.monotonic()
+            for message_id in [k for k, t in self._last_sweep.items() if t < now - self._window]:
+                if message_id not in self._timers:
+                    del self._last_sweep[message_id]
+
+    def stats(self):
+        return {
+            'ignored': len(self._ignored),
+            'pending sweeps': len(self._timers),
+            'sweeps': self.sweeps,
+            'skipped sweeps': self.skipped_sweeps,
+            'removed': self.removed
+        }
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict, deque
+
+import discord
+
+logger = logging.getLogger('discord')
+
+
+class _PollRefresh:
+    __slots__ = ('poll', 'message', 'timer', 'events', 'requests', 'edits', 'skipped',
+                 'version', 'embed', 'message_id', 'digest')
+
+    def __init__(self):
+        self.poll = None
+        self.message = None
+        self.timer = None
+        self.events = deque()
+        self.requests = 0
+        self.edits = 0
+        self.skipped = 0
+        # last rendered embed and the render version of the poll it belongs to
+        self.version = None
+        self.embed = None
+        # hash of the embed the message was last edited to
+        self.message_id = None
+        self.digest = None
+
+
+class RefreshScheduler:
+    """Debounces the edits of poll messages.
+    A refresh request arms one timer per poll and keeps the latest poll object and message handle.
+    When the timer fires, the message is edited once with the state of that poll. A poll that was loaded with a
+    projection is loaded again with all its fields then, once per edit instead of once per reaction.
+    The delay grows with the vote rate: min_delay for an idle poll, up to max_delay under heavy voting.
+    The embed is only rendered again when the tally or the poll changed, and the edit is skipped when the
+    rendered embed is the same as the one on the message (hidden counts, a vote that was taken back, ...)."""
+
+    def __init__(self, _bot, min_delay=1, max_delay=15, rate_window=10, size=5000):
+        self._bot = _bot
+        self._min_delay = min_delay
+        self._max_delay = max_delay
+        self._rate_window = rate_window
+        self._size = size
+        self._refreshes = OrderedDict()
+
+    def get_delay(self, refresh):
+        now = time.monotonic()
+        while refresh.events and refresh.events[0] < now - self._rate_window:
+            refresh.events.popleft()
+        rate = len(refresh.events) / self._rate_window
+        return min(self._max_delay, self._min_delay * (1 + rate))
+
+    async def schedule(self, poll, message, force=False):
+        key = str(poll.id)
+        refresh = self._refreshes.get(key, None)
+        if refresh is None:
+            refresh = self._refreshes[key] = _PollRefresh()
+            if len(self._refreshes) > self._size:
+                # forget the counters of the least recently refreshed poll without a pending edit
+                for old_key, old_refresh in self._refreshes.items():
+                    if old_refresh.timer is None and old_key != key:
+                        del self._refreshes[old_key]
+                        break
+        self._refreshes.move_to_end(key)
+        refresh.poll = poll
+        refresh.message = message
+        refresh.requests += 1
+        refresh.events.append(time.monotonic())
+
+        if force:
+            if refresh.timer is not None:
+                refresh.timer.cancel()
+            await self._edit(key)
+        elif refresh.timer is None:
+            refresh.timer = self._bot.loop.call_later(
+                self.get_delay(refresh), lambda: self._bot.loop.create_task(self._edit(key))
+            )
+
+    async def _edit(self, key):
+        refresh = self._refreshes.get(key, None)
+        if refresh is None:
+            return
+        refresh.timer = None
+        message = refresh.message
+        # the reaction handlers load polls with the fields of a vote only, the embed needs all of them
+        poll = await refresh.poll.get_full()
+        if poll is None:
+            return
+        # counts are read again, everything else is the state of the latest poll object
+        poll.vote_counts = {}
+        poll.vote_counts_weighted = {}
+        try:
+            version = await poll.get_render_version()
+            if version != refresh.version:
+                refresh.embed = await poll.generate_embed()
+                refresh.version = version
+            digest = self.get_digest(refresh.embed)
+            if message.id == refresh.message_id and digest == refresh.digest:
+                refresh.skipped += 1
+                return
+            await message.edit(embed=refresh.embed)
+            refresh.message_id = message.id
+            refresh.digest = digest
+            refresh.edits += 1
+        except discord.HTTPException as e:
+            logger.warning(f'Could not refresh poll {key}: {e}')
+
+    def forget_poll(self, poll_id):
+        refresh = self._refreshes.pop(str(poll_id), None)
+        if refresh is not None and refresh.timer is not None:
+            refresh.timer.cancel()
+
+    @staticmethod
+    def get_digest(embed):
+        return hashlib.sha1(json.dumps(embed.to_dict(), sort_keys=True).encode('utf-8')).digest()
+
+    def stats(self, poll_id=None):
+        if poll_id is not None:
+            refresh = self._refreshes.get(str(poll_id), None)
+            if refresh is None:
+                return {}
+            return {'requests': refresh.requests, 'edits': refresh.edits, 'skipped': refresh.skipped,
+                    'coalesced': refresh.requests - refresh.edits - refresh.skipped,
+                    'pending': refresh.timer is not None}
+        requests = sum(r.requests for r in self._refreshes.values())
+        edits = sum(r.edits for r in self._refreshes.values())
+        skipped = sum(r.skipped for r in self._refreshes.values())
+        return {
+            'polls': len(self._refreshes),
+            'pending': sum(1 for r in self._refreshes.values() if r.timer is not None),
+            'requests': requests,
+            'edits': edits,
+            'skipped': skipped,
+            'coalesced': requests - edits - skipped
+        }
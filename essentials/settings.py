@@ -15,6 +15,30 @@ class Settings:
         self.invite_link = \
             'https://discordapp.com/api/oauth2/authorize?client_id=444831720659877889&permissions=126016&scope=bot'
 
+        # caches (per cluster)
+        self.poll_cache_size = 1000
+        self.poll_cache_ttl = 60
+        self.message_cache_size = 1000
+        self.message_cache_ttl = 3600
+        self.member_cache_size = 1000
+        self.member_cache_ttl = 3600
+        self.member_cache_negative_ttl = 600
+
+        # collect the ballot updates and tally increments of votes and write them after vote_flush_delay seconds,
+        # the ballots of up to vote_ballot_cache_size users are kept in memory
+        self.vote_write_behind = True
+        self.vote_flush_delay = 0.05
+        self.vote_ballot_cache_size = 10000
+
+        # move polls to the archive archive_after_days after they closed, archive_batch_size polls per run
+        self.archive_after_days = 30
+        self.archive_batch_size = 50
+
+        # delete the data of deleted polls in batches, and the data of servers gc_grace_days after the bot left
+        self.gc_batch_size = 500
+        self.gc_pause = 1
+        self.gc_grace_days = 7
+
         self.load_secrets()
 
     def load_secrets(self):
@@ -0,0 +1,267 @@
+import asyncio
+import datetime
+import logging
+import weakref
+from collections import OrderedDict, defaultdict
+
+from bson import Int64
+from pymongo import UpdateOne, DeleteOne
+
+from models.tally import Tally
+
+logger = logging.getLogger('discord')
+
+
+class VoteBuffer:
+    """Write-behind stage for the ballots and tallies of polls.
+    The ballots this cluster touched are known in memory, so the vote rules are checked without a round trip and
+    a vote only has to be written later. Votes and unvotes are collected per poll for a few milliseconds and written
+    as one ordered bulk_write of ballot updates, followed by one $inc of the poll's tally.
+    Operations of the same user on the same choice are coalesced into their net effect.
+    The votes of a poll arrive at the cluster of its server only, so the known ballots stay in sync with the database.
+    Reads of a single ballot are served from memory, every other read of a poll's votes has to flush the poll first."""
+
+    def __init__(self, _bot, enabled=True, delay=0.05, size=10000):
+        self._bot = _bot
+        self.enabled = enabled
+        self._delay = delay
+        self._size = size
+        # (poll_id, user_id) -> {'choices': [...], 'weight': ..., 'answers': {...}}
+        self._ballots = OrderedDict()
+        # poll_id -> OrderedDict: (user_id, choice) -> (first op, last op, data)
+        self._pending = {}
+        self._inflight = {}
+        # poll_id -> field -> increment of the tally document
+        self._tallies = {}
+        self._timers = {}
+        # a lock only lives while a flush holds or waits for it
+        self._locks = weakref.WeakValueDictionary()
+        self.ops_buffered = 0
+        self.ops_coalesced = 0
+        self.ops_written = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+
+    def lock(self, poll_id):
+        lock = self._locks.get(poll_id)
+        if lock is None:
+            lock = self._locks[poll_id] = asyncio.Lock()
+        return lock
+
+    async def load_ballot(self, poll_id, user_id):
+        """The ballot of a user including the buffered operations. Changes go through vote, unvote and set_answer."""
+        key = (poll_id, str(user_id))
+        ballot = self._ballots.get(key, None)
+        if ballot is None:
+            d = await self._bot.db.ballots.find_one(
+                {'poll_id': poll_id, 'user_id': key[1]}, {'choices': True, 'weight': True, 'answers': True}
+            )
+            # another vote of the user may have loaded the ballot meanwhile
+            ballot = self._ballots.get(key, None)
+            if ballot is None:
+                self._trim()
+                ballot = self._ballots[key] = {
+                    'choices': d.get('choices', []) if d else [],
+                    'weight': d.get('weight', 1) if d else None,
+                    'answers': d.get('answers', {}) if d else {}
+                }
+        self._ballots.move_to_end(key)
+        return ballot
+
+    def _trim(self):
+        # ballots with operations that are not written yet are kept
+        for _ in range(len(self._ballots)):
+            if len(self._ballots) < self._size:
+                return
+            key, ballot = self._ballots.popitem(last=False)
+            if key[0] in self._pending or key[0] in self._inflight:
+                self._ballots[key] = ballot
+
+    def vote(self, poll_id, user_id, choice, weight=1, answer=''):
+        """Add a choice to a loaded ballot, returns the weight of the ballot"""
+        user_id = str(user_id)
+        ballot = self._ballots[(poll_id, user_id)]
+        first = not ballot['choices']
+        if first:
+            ballot['weight'] = weight
+        ballot['choices'].append(choice)
+        if answer:
+            ballot['answers'][str(choice)] = answer
+        else:
+            ballot['answers'].pop(str(choice), None)
+        data = {'weight': ballot['weight'], 'time': datetime.datetime.utcnow(), 'answer': answer}
+        self._queue(poll_id, user_id, choice, 'vote', data)
+        self._add_tally(poll_id, choice, 1, ballot['weight'], 1 if first else 0)
+        return ballot['weight']
+
+    def unvote(self, poll_id, user_id, choice):
+        """Remove a choice from a loaded ballot"""
+        user_id = str(user_id)
+        ballot = self._ballots[(poll_id, user_id)]
+        ballot['choices'].remove(choice)
+        ballot['answers'].pop(str(choice), None)
+        self._queue(poll_id, user_id, choice, 'unvote', None)
+        self._add_tally(poll_id, choice, -1, -ballot['weight'], 0 if ballot['choices'] else -1)
+
+    async def set_answer(self, poll_id, user_id, choice, answer):
+        """Store the answer of a vote. The ballot may have been dropped from memory while the user was asked for
+        the answer, it is then loaded again."""
+        user_id = str(user_id)
+        ballot = await self.load_ballot(poll_id, user_id)
+        if choice not in ballot['choices']:
+            # the vote was taken back meanwhile
+            return
+        if answer:
+            ballot['answers'][str(choice)] = answer
+        else:
+            ballot['answers'].pop(str(choice), None)
+        self._queue(poll_id, user_id, choice, 'answer', {'answer': answer})
+
+    def _queue(self, poll_id, user_id, choice, op, data):
+        pending = self._pending.setdefault(poll_id, OrderedDict())
+        key = (user_id, choice)
+        entry = pending.get(key, None)
+        self.ops_buffered += 1
+        if entry is None:
+            pending[key] = (op, op, data)
+        else:
+            self.ops_coalesced += 1
+            first, last, last_data = entry
+            if first == 'vote' and op == 'unvote':
+                # votes are only added if they don't exist yet, so this one never has to reach the database
+                del pending[key]
+            elif op == 'answer':
+                pending[key] = (first, last, {**last_data, 'answer': data['answer']})
+            else:
+                pending[key] = (first, op, data)
+        self._arm(poll_id, self._delay)
+
+    def _add_tally(self, poll_id, choice, count, weight, voters):
+        increments = self._tallies.setdefault(poll_id, defaultdict(int))
+        for field, value in Tally.get_increment(choice, count, weight, voters).items():
+            increments[field] += value
+        self._arm(poll_id, self._delay)
+
+    def _arm(self, poll_id, delay):
+        if poll_id not in self._timers:
+            self._timers[poll_id] = self._bot.loop.call_later(
+                delay, lambda: self._bot.loop.create_task(self.flush(poll_id))
+            )
+
+    async def flush(self, poll_id, locked=False):
+        """Write the pending operations of a poll. Pass locked if the caller already holds lock(poll_id)."""
+        timer = self._timers.pop(poll_id, None)
+        if timer:
+            timer.cancel()
+        if locked:
+            await self._write(poll_id)
+        else:
+            async with self.lock(poll_id):
+                await self._write(poll_id)
+
+    async def _write(self, poll_id):
+        pending = self._pending.pop(poll_id, None)
+        increments = self._tallies.pop(poll_id, None)
+        if pending:
+            self._inflight[poll_id] = pending
+            requests = self._get_requests(poll_id, pending)
+            try:
+                await self._bot.db.ballots.bulk_write(requests, ordered=True)
+                self.ops_written += len(pending)
+            except Exception as e:
+                # the ballots and their increments are written again later, together with the newer operations
+                self.failed_flushes += 1
+                logger.exception(f'Failed to flush {len(requests)} ballot operations of poll {poll_id}: {e}')
+                self._requeue(poll_id, pending, increments)
+                return
+            finally:
+                del self._inflight[poll_id]
+        if increments:
+            try:
+                await self._bot.db.tallies.update_one({'_id': poll_id}, {'$inc': dict(increments)}, upsert=True)
+            except Exception as e:
+                self.failed_flushes += 1
+                logger.exception(f'Failed to flush the tally of poll {poll_id}: {e}')
+                self._requeue(poll_id, None, increments)
+                return
+        if pending or increments:
+            self.flushes += 1
+
+    def _get_requests(self, poll_id, pending):
+        requests = []
+        users = set()
+        for (user_id, choice), (_, op, data) in pending.items():
+            key = {'poll_id': poll_id, 'user_id': user_id}
+            users.add(user_id)
+            if op == 'vote':
+                update = {
+                    '$addToSet': {'choices': choice},
+                    '$bit': {'mask': {'or': Int64(1 << choice)}},
+                    '$set': {f'times.{choice}': data['time'], 'weight': data['weight']}
+                }
+                if data['answer']:
+                    update['$set'][f'answers.{choice}'] = data['answer']
+                else:
+                    update['$unset'] = {f'answers.{choice}': ''}
+                requests.append(UpdateOne(key, update, upsert=True))
+            elif op == 'unvote':
+                requests.append(UpdateOne(key, {
+                    '$pull': {'choices': choice},
+                    '$bit': {'mask': {'and': Int64(~(1 << choice))}},
+                    '$unset': {f'answers.{choice}': '', f'times.{choice}': ''}
+                }))
+            elif data['answer']:
+                requests.append(UpdateOne({**key, 'choices': choice}, {'$set': {f'answers.{choice}': data['answer']}}))
+            else:
+                requests.append(UpdateOne({**key, 'choices': choice}, {'$unset': {f'answers.{choice}': ''}}))
+        for user_id in users:
+            ballot = self._ballots.get((poll_id, user_id), None)
+            if ballot is not None and not ballot['choices']:
+                requests.append(DeleteOne({'poll_id': poll_id, 'user_id': user_id, 'choices': {'$size': 0}}))
+        return requests
+
+    def _requeue(self, poll_id, pending, increments):
+        if pending:
+            # all operations are idempotent, but they may be written in part and must not be coalesced away anymore
+            newer = self._pending.get(poll_id, OrderedDict())
+            merged = OrderedDict()
+            for key, entry in pending.items():
+                merged[key] = ('retry',) + (newer[key][1:] if key in newer else entry[1:])
+            for key, entry in newer.items():
+                if key not in merged:
+                    merged[key] = entry
+            self._pending[poll_id] = merged
+        if increments:
+            newer_increments = self._tallies.setdefault(poll_id, defaultdict(int))
+            for field, value in increments.items():
+                newer_increments[field] += value
+        self._arm(poll_id, 1)
+
+    def forget_poll(self, poll_id):
+        """Drop everything buffered or known for a poll whose votes were deleted"""
+        timer = self._timers.pop(poll_id, None)
+        if timer:
+            timer.cancel()
+        self._pending.pop(poll_id, None)
+        self._tallies.pop(poll_id, None)
+        for key in [k for k in self._ballots if k[0] == poll_id]:
+            del self._ballots[key]
+
+    async def flush_all(self):
+        for poll_id in set(self._pending.keys()) | set(self._tallies.keys()):
+            await self.flush(poll_id)
+
+    async def close(self):
+        self.enabled = False
+        await self.flush_all()
+
+    def stats(self):
+        return {
+            'pending polls': len(set(self._pending.keys()) | set(self._tallies.keys())),
+            'known ballots': len(self._ballots),
+            'buffered': self.ops_buffered,
+            'coalesced': self.ops_coalesced,
+            'written': self.ops_written,
+            'flushes': self.flushes,
+            'failed flushes': self.failed_flushes
+        }
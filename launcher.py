@@ -147,6 +147,7 @@ class Cluster:
             owner_id=SETTINGS.owner_id,
             fetch_offline_members=False,
             max_messages=15000,
+            message_cache_size=SETTINGS.message_cache_size,
             shard_ids=shard_ids,
             shard_count=max_shards,
             cluster_name=name
@@ -22,7 +22,7 @@ async def migrate():
     counter = 0
     async for p in polls:
         dict_list = []
-        for user in p['votes']:
+        for user in p.get('votes', {}):
             weight = p['votes'][user]['weight']
             choices = p['votes'][user]['choices']
             if 'answers' in p['votes'][user].keys():
@@ -0,0 +1,44 @@
+from bson import Int64
+from pymongo import UpdateOne
+
+from migrations.migration import Migration
+
+
+class MergeLegacyVotes(Migration):
+    """Moves the votes table (one document per vote, before 2.6) into the ballots (one document per poll and user).
+    Every vote is merged into the ballot of its user, choices cast since the update are kept, answers given since
+    the update win. Merged votes are removed from the votes table and the tallies of their polls are marked stale,
+    so they are counted again the next time they are read."""
+    version = 2
+    name = 'merge legacy votes'
+    collections = ('votes',)
+    projection = {'poll_id': True, 'user_id': True, 'choice': True, 'weight': True, 'answer': True}
+    target = 'ballots'
+    # the answer of a vote is only set once its ballot exists
+    ordered = True
+
+    def get_operations(self, d):
+        choice = d['choice']
+        key = {'poll_id': d['poll_id'], 'user_id': str(d['user_id'])}
+        operations = [UpdateOne(
+            key,
+            {'$addToSet': {'choices': choice},
+             '$bit': {'mask': {'or': Int64(1 << choice)}},
+             '$setOnInsert': {'weight': d.get('weight', 1)}},
+            upsert=True
+        )]
+        if d.get('answer'):
+            operations.append(UpdateOne(
+                {**key, f'answers.{choice}': {'$exists': False}},
+                {'$set': {f'answers.{choice}': d['answer']}}
+            ))
+        return operations
+
+    async def after_batch(self, db, batch):
+        await db.votes.delete_many({'_id': {'$in': [d['_id'] for d in batch]}})
+        await mark_tallies_stale(db, {d['poll_id'] for d in batch})
+
+
+async def mark_tallies_stale(db, poll_ids):
+    # the new version makes a rebuild that counted the old ballots fail its version check
+    await db.tallies.update_many({'_id': {'$in': list(poll_ids)}}, {'$set': {'stale': True}, '$inc': {'v': 1}})
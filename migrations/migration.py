@@ -0,0 +1,19 @@
+class Migration:
+    """A versioned step of the migrations. The runner walks the documents of collections that match query
+    and writes the operations get_operations returns for each of them to target (default: the walked collection).
+    after_batch is called once the operations of a batch are written.
+    Required migrations are run when the bot starts, because the bot relies on their changes."""
+    version = 0
+    name = ''
+    collections = ()
+    query = {}
+    projection = None
+    target = None
+    ordered = False
+    required = False
+
+    def get_operations(self, d):
+        return []
+
+    async def after_batch(self, db, batch):
+        pass
@@ -0,0 +1,41 @@
+from pymongo import UpdateOne
+
+from migrations.migration import Migration
+
+
+class NormalizePolls(Migration):
+    """Brings the polls written by older versions to the current schema:
+    multiple_choice as an int instead of a bool (or a string), hide_count and survey_flags always set.
+    Empty legacy votes maps are removed, filled ones are kept for 1_to2-5_migrate_votes.py."""
+    version = 1
+    name = 'normalize polls'
+    # Poll.from_dict loads the fields as they are
+    required = True
+    collections = ('polls', 'polls_archive')
+    query = {'$or': [
+        {'multiple_choice': {'$not': {'$type': ['int', 'long']}}},
+        {'hide_count': {'$exists': False}},
+        {'survey_flags': {'$exists': False}},
+        {'votes': {}}
+    ]}
+    projection = {'multiple_choice': True, 'hide_count': True, 'survey_flags': True}
+
+    def get_operations(self, d):
+        changes = {}
+        multiple_choice = d.get('multiple_choice', 1)
+        if isinstance(multiple_choice, bool):
+            changes['multiple_choice'] = 0 if multiple_choice else 1
+        elif not isinstance(multiple_choice, int):
+            try:
+                changes['multiple_choice'] = int(multiple_choice)
+            except (TypeError, ValueError):
+                changes['multiple_choice'] = 0
+        if 'hide_count' not in d:
+            changes['hide_count'] = False
+        if 'survey_flags' not in d:
+            changes['survey_flags'] = []
+
+        operations = [UpdateOne({'_id': d['_id'], 'votes': {}}, {'$unset': {'votes': ''}})]
+        if changes:
+            operations.append(UpdateOne({'_id': d['_id']}, {'$set': changes}))
+        return operations
@@ -0,0 +1,138 @@
+#  RUNS THE VERSIONED MIGRATIONS OF THE DATABASE
+#  python -m migrations.runner [--batch-size 500] [--pause 0]
+#
+#  Every migration walks the documents of its collections in batches ordered by _id and writes the changes of a batch
+#  with one bulk_write. After each batch a checkpoint is stored in the "migrations" table, so an interrupted run
+#  continues where it stopped when it is started again. Finished migrations are skipped.
+#  The migrations can run while the bot is online. Required migrations are run by the bot when it starts.
+#
+#  1 normalize polls (required): multiple_choice, hide_count and survey_flags in the current format (polls from
+#    before 2.6)
+#  2 merge legacy votes: moves the votes table (before 2.6) into the ballots. Until it has run, the bot merges the
+#    votes of a poll the first time the poll is used.
+
+import argparse
+import asyncio
+import datetime
+import time
+
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from essentials.settings import SETTINGS
+from migrations.build_ballots import MergeLegacyVotes
+from migrations.normalize_polls import NormalizePolls
+
+MIGRATIONS = [
+    NormalizePolls(),
+    MergeLegacyVotes()
+]
+
+
+class MigrationRunner:
+    def __init__(self, db, migrations, batch_size=500, pause=0):
+        self.db = db
+        self.migrations = sorted(migrations, key=lambda m: m.version)
+        self.batch_size = batch_size
+        self.pause = pause
+
+    async def run(self):
+        for migration in self.migrations:
+            for collection in migration.collections:
+                await self.run_migration(migration, collection)
+
+    async def run_migration(self, migration, collection):
+        key = f'{migration.version}:{collection}'
+        checkpoint = await self.db.migrations.find_one({'_id': key}) or {}
+        if checkpoint.get('done'):
+            print(f'{key} {migration.name}: done at {checkpoint.get("finished_at")}, skipped.')
+            return
+
+        last_id = checkpoint.get('last_id')
+        processed = checkpoint.get('processed', 0)
+        modified = checkpoint.get('modified', 0)
+        total = processed + await self.db[collection].count_documents(self.get_query(migration, last_id))
+        started = time.monotonic()
+        processed_now = 0
+        print(f'{key} {migration.name}: {total - processed} documents to go.')
+
+        while True:
+            batch = await self.db[collection].find(self.get_query(migration, last_id), migration.projection) \
+                .sort('_id', 1).limit(self.batch_size).to_list(None)
+            if not batch:
+                break
+            operations = [op for d in batch for op in migration.get_operations(d)]
+            if operations:
+                result = await self.db[migration.target or collection].bulk_write(
+                    operations, ordered=migration.ordered
+                )
+                modified += result.modified_count + result.upserted_count
+            await migration.after_batch(self.db, batch)
+            last_id = batch[-1]['_id']
+            processed += len(batch)
+            processed_now += len(batch)
+            await self.db.migrations.update_one(
+                {'_id': key},
+                {'$set': {'last_id': last_id, 'processed': processed, 'modified': modified}},
+                upsert=True
+            )
+            rate = processed_now / max(time.monotonic() - started, 0.001)
+            print(f'{key} {migration.name}: {processed}/{total} documents, {modified} changed, {rate:.0f} docs/s')
+            if self.pause:
+                await asyncio.sleep(self.pause)
+
+        await self.db.migrations.update_one(
+            {'_id': key},
+            {'$set': {'done': True, 'processed': processed, 'modified': modified,
+                      'finished_at': datetime.datetime.utcnow()}},
+            upsert=True
+        )
+        print(f'{key} {migration.name}: done, {processed} documents, {modified} changed.')
+
+    @staticmethod
+    def get_query(migration, last_id):
+        if last_id is None:
+            return migration.query
+        return {'$and': [migration.query, {'_id': {'$gt': last_id}}]}
+
+
+async def get_pending_migrations(db, migrations=None):
+    """Names of the migrations that still have documents to change. Collections without any are marked done,
+    so they are only checked once."""
+    pending = []
+    for migration in sorted(migrations or MIGRATIONS, key=lambda m: m.version):
+        for collection in migration.collections:
+            key = f'{migration.version}:{collection}'
+            checkpoint = await db.migrations.find_one({'_id': key}) or {}
+            if checkpoint.get('done'):
+                continue
+            if await db[collection].count_documents(migration.query, limit=1):
+                pending.append(f'{key} {migration.name}')
+            elif not checkpoint:
+                await db.migrations.update_one(
+                    {'_id': key},
+                    {'$set': {'done': True, 'processed': 0, 'modified': 0,
+                              'finished_at': datetime.datetime.utcnow()}},
+                    upsert=True
+                )
+    return pending
+
+
+async def run_required_migrations(db):
+    """Run the migrations the bot can't start without, a run that was interrupted continues"""
+    await MigrationRunner(db, [m for m in MIGRATIONS if m.required]).run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the migrations of the database.')
+    parser.add_argument('--batch-size', type=int, default=500, help='documents per bulk write')
+    parser.add_argument('--pause', type=float, default=0, help='seconds to wait between two batches')
+    args = parser.parse_args()
+
+    mongo = AsyncIOMotorClient(SETTINGS.mongo_db)
+    runner = MigrationRunner(mongo.pollmaster, MIGRATIONS, args.batch_size, args.pause)
+    loop = asyncio.get_event_loop()
+    loop.run_until_complete(runner.run())
+
+
+if __name__ == '__main__':
+    main()
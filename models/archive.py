@@ -0,0 +1,119 @@
+import datetime
+import json
+import zlib
+
+from bson import Binary, ObjectId
+
+from models.tally import Tally
+from models.vote import Vote, VoteSummary
+from models.votecolumns import VoteColumns
+
+
+class ArchivedVotes:
+    """The votes of an archived poll: its frozen tally and its ballots.
+    The ballots are stored as one compressed list of [user_id, choices, weight, answers, times], sorted by user,
+    and only unpacked when a poll's votes have to be listed. Polls archived before vote times existed have no times."""
+
+    def __init__(self, poll_id: ObjectId, tally: Tally, data: bytes):
+        self.poll_id = poll_id
+        self.tally = tally
+        self._data = data
+
+    @staticmethod
+    def from_dict(d):
+        t = d.get('tally', {})
+        tally = Tally.from_dict({'_id': d['_id'], 'counts': t.get('counts', {}), 'weighted': t.get('weighted', {}),
+                                 'voters': t.get('voters', 0)})
+        return ArchivedVotes(d['_id'], tally, d.get('ballots'))
+
+    @staticmethod
+    def pack(ballots):
+        return Binary(zlib.compress(json.dumps(ballots, separators=(',', ':')).encode('utf-8'), 9))
+
+    def unpack(self):
+        """The ballots, decompressed on every call. Polls are copied out of the cache, so the unpacked list is not
+        kept around."""
+        return json.loads(zlib.decompress(self._data).decode('utf-8')) if self._data else []
+
+    def get_summary(self):
+        return VoteSummary(self.tally.counts, self.tally.weighted, dict(self.tally.counts), self.tally.voters)
+
+    def get_columns(self):
+        columns = VoteColumns()
+        for user_id, choices, weight, answers, *_ in self.unpack():
+            for c in choices:
+                columns.append(user_id, c, weight, answers.get(str(c), ''))
+        return columns
+
+    def get_votes_for_user(self, bot, user_id):
+        user_id = str(user_id)
+        for b_user_id, choices, weight, answers, *_ in self.unpack():
+            if b_user_id == user_id:
+                return [Vote(bot, self.poll_id, user_id, c, weight, answers.get(str(c), '')) for c in choices]
+        return []
+
+    def iter_votes(self, fields=None, sort=None, choices=None):
+        """Same documents as Vote.iter_votes_for_poll"""
+        votes = (
+            {'user_id': b[0], 'choice': c, 'weight': b[2], 'answer': b[3].get(str(c), ''),
+             'time': datetime.datetime.fromisoformat(b[4][str(c)]) if len(b) > 4 and str(c) in b[4] else None}
+            for b in self.unpack()
+            for c in b[1] if choices is None or c in choices
+        )
+        if sort == 'choice':
+            votes = sorted(votes, key=lambda v: (v['choice'], v['user_id']))
+        for d in votes:
+            if fields is not None:
+                d = {f: d[f] for f in fields}
+            yield d
+
+
+class Archive:
+    """Closed polls that are moved out of the polls collection, together with their votes.
+    An archived poll is one document in polls_archive: the poll, its frozen tally and its compressed ballots."""
+
+    @staticmethod
+    async def archive_poll(bot, d):
+        """Move a closed poll to the archive. Returns False if the poll was changed meanwhile.
+        d is the poll as loaded with Poll.get_projection(), so legacy fields like the old votes map are not copied."""
+        poll_id = d['_id']
+        tally = await Tally.rebuild(bot, poll_id)
+        ballots = [
+            [b['user_id'], b.get('choices', []), b.get('weight', 1), b.get('answers', {}), {
+                str(c): (b.get('times', {}).get(str(c)) or b['_id'].generation_time.replace(tzinfo=None)).isoformat()
+                for c in b.get('choices', [])
+            }]
+            async for b in bot.db.ballots.find(
+                {'poll_id': poll_id},
+                {'user_id': True, 'choices': True, 'weight': True, 'answers': True, 'times': True}
+            ).sort('user_id', 1)
+        ]
+        doc = dict(d)
+        doc['tally'] = {
+            'counts': {str(c): n for c, n in tally.counts.items()},
+            'weighted': {str(c): w for c, w in tally.weighted.items()},
+            'voters': tally.voters
+        }
+        doc['ballots'] = ArchivedVotes.pack(ballots)
+        doc['archived_at'] = datetime.datetime.utcnow()
+        await bot.db.polls_archive.replace_one({'_id': poll_id}, doc, upsert=True)
+
+        # the poll could have been reopened or deleted in the meantime
+        result = await bot.db.polls.delete_one({'_id': poll_id, 'open': False})
+        if result.deleted_count == 0:
+            await bot.db.polls_archive.delete_one({'_id': poll_id})
+            return False
+        await bot.db.ballots.delete_many({'poll_id': poll_id})
+        await bot.db.tallies.delete_one({'_id': poll_id})
+        bot.poll_cache.invalidate(poll_id=poll_id)
+        bot.vote_buffer.forget_poll(poll_id)
+        return True
+
+    @staticmethod
+    async def load(bot, server_id, short):
+        return await bot.db.polls_archive.find_one({'server_id': str(server_id), 'short': short},
+                                                   sort=[('_id', -1)])
+
+    @staticmethod
+    async def exists(bot, server_id, short):
+        return await bot.db.polls_archive.count_documents({'server_id': str(server_id), 'short': short}, limit=1) > 0
@@ -1,11 +1,12 @@
 import asyncio
-import codecs
+import copy
+import csv
 import datetime
+import io
+import json
 import logging
-import os
 import random
 import re
-import time
 from string import ascii_lowercase
 from uuid import uuid4
 
@@ -14,24 +15,27 @@ import discord
 import pytz
 import regex
 from bson import ObjectId
-from matplotlib import rcParams
-from matplotlib.afm import AFM
-from pytz import UnknownTimeZoneError
-from unidecode import unidecode
+from pymongo.errors import DuplicateKeyError
 
 from essentials.exceptions import *
 from essentials.multi_server import get_pre
 from essentials.settings import SETTINGS
-from models.vote import Vote
-from utils.misc import possible_timezones
+from models.archive import Archive, ArchivedVotes
+from models.tally import Tally
+from models.vote import Vote, VoteOutcome
+from models.votecolumns import VoteColumns
+from utils.exportwriter import ExportWriter
+from utils.misc import get_timezone, get_timezone_name
+from utils.poll_name_generator import generate_labels
+from utils.textwidth import get_text_width
 
 logger = logging.getLogger('discord')
 
-# Helvetica is the closest font to Whitney (discord uses Whitney) in afm
-# This is used to estimate text width and adjust the layout of the embeds
-afm_fname = os.path.join(rcParams['datapath'], 'fonts', 'afm', 'phvr8a.afm')
-with open(afm_fname, 'rb') as fh:
-    afm = AFM(fh)
+# lines of an export after which the event loop gets a turn
+EXPORT_BATCH_SIZE = 100
+# report for people, and one row per vote for spreadsheets and scripts
+EXPORT_FORMATS = ('txt', 'csv', 'jsonl')
+EXPORT_COLUMNS = ('user_id', 'name', 'choice', 'option', 'weight', 'answer', 'time')
 
 # A-Z Emojis for Discord
 AZ_EMOJIS = [(b'\\U0001f1a'.replace(b'a', bytes(hex(224 + (6 + i))[2:], "utf-8"))).decode("unicode-escape") for i in
@@ -46,8 +50,23 @@ class Poll:
 
         self.vote_counts = {}
         self.vote_counts_weighted = {}
-        self.full_votes = []
-        self.unique_participants = set()
+        # version of the tally the vote counts were loaded from
+        self.tally_version = 0
+        self.full_votes = None
+        # votes of a poll loaded from the archive
+        self.archive = None
+        # the fields as they are in the db, to only save the ones that changed
+        self._saved = None
+        # fields of the document the poll was loaded from, None if it has all of them
+        self.fields = None
+        # the label was picked at random and can be replaced if it is taken
+        self.short_generated = False
+        # resolved when they are first used
+        self._author = None
+        self.author_id = 0
+        self._channel = None
+        self.channel_id = 0
+        self._options_reaction_emoji_only = None
 
         if not load and ctx:
             if server is None:
@@ -86,10 +105,80 @@ class Poll:
             self.active = True
             self.activation = 0
             self.activation_tz = 0.0
-            self.votes = {}
 
             self.wizard_messages = []
 
+    # fields of a poll document
+    FIELDS = ('server_id', 'channel_id', 'author', 'name', 'short', 'anonymous', 'hide_count', 'reaction',
+              'multiple_choice', 'options_reaction', 'reaction_default', 'survey_flags', 'roles', 'weights_roles',
+              'weights_numbers', 'duration', 'duration_tz', 'time_created', 'open', 'active', 'activation',
+              'activation_tz')
+    # attributes of the fields that are loaded as they are
+    ATTRIBUTES = {'name': 'name', 'anonymous': 'anonymous', 'hide_count': 'hide_count', 'reaction': 'reaction',
+                  'multiple_choice': 'multiple_choice', 'options_reaction': 'options_reaction',
+                  'reaction_default': 'options_reaction_default', 'survey_flags': 'survey_flags', 'roles': 'roles',
+                  'weights_roles': 'weights_roles', 'weights_numbers': 'weights_numbers', 'duration': 'duration',
+                  'duration_tz': 'duration_tz', 'time_created': 'time_created', 'open': 'open', 'active': 'active',
+                  'activation': 'activation', 'activation_tz': 'activation_tz'}
+    # fields the reaction handlers need to check and count a vote
+    VOTE_FIELDS = ('anonymous', 'hide_count', 'multiple_choice', 'options_reaction', 'reaction_default',
+                   'survey_flags', 'roles', 'weights_roles', 'weights_numbers', 'duration', 'duration_tz', 'open',
+                   'active', 'activation', 'activation_tz')
+
+    @staticmethod
+    def get_projection(fields=None):
+        """Projection for loading polls. Without fields, everything but the legacy votes field is loaded."""
+        if fields is None:
+            fields = Poll.FIELDS
+        return {f: True for f in ('server_id', 'short', *fields)}
+
+    @property
+    def author(self):
+        """Author from the member cache of the server, use get_author to fetch it if it isn't cached"""
+        if self._author is None and self.author_id and self.server:
+            self._author = self.server.get_member(self.author_id)
+        return self._author
+
+    @author.setter
+    def author(self, author):
+        self._author = author
+        self.author_id = author.id if author else 0
+
+    async def get_author(self):
+        if self.author is None and self.author_id and self.server:
+            self._author = await self.bot.member_cache.get(self.server, self.author_id)
+        return self._author
+
+    @property
+    def channel(self):
+        if self._channel is None and self.channel_id:
+            self._channel = self.bot.get_channel(self.channel_id)
+        return self._channel
+
+    @channel.setter
+    def channel(self, channel):
+        self._channel = channel
+        self.channel_id = channel.id if channel else 0
+
+    @property
+    def options_reaction_emoji_only(self):
+        if self._options_reaction_emoji_only is None:
+            self.set_emoji_only()
+        return self._options_reaction_emoji_only
+
+    @options_reaction_emoji_only.setter
+    def options_reaction_emoji_only(self, emoji_only):
+        self._options_reaction_emoji_only = emoji_only
+
+    def copy(self):
+        """Shallow copy with its own vote data, used to hand out cached polls"""
+        p = copy.copy(self)
+        p.cursor_pos = 0
+        p.vote_counts = {}
+        p.vote_counts_weighted = {}
+        p.full_votes = None
+        return p
+
     @staticmethod
     def get_preset_options(number):
         if number == 1:
@@ -109,7 +198,7 @@ class Poll:
                 and datetime.datetime.utcnow().replace(tzinfo=pytz.utc) > self.get_duration_with_tz():
             self.open = False
             if update_db:
-                await self.save_to_db()
+                await self.close()
         return self.open
 
     async def is_active(self, update_db=True):
@@ -120,9 +209,28 @@ class Poll:
                 and datetime.datetime.utcnow().replace(tzinfo=pytz.utc) > self.get_activation_with_tz():
             self.active = True
             if update_db:
-                await self.save_to_db()
+                await self.activate()
         return self.active
 
+    async def close(self):
+        """Close the poll. Returns False if it was closed already.
+        The time it was closed is stored with it, archiving closed polls counts from there."""
+        return await self._flip('open', True, False, {'closed_at': datetime.datetime.utcnow()})
+
+    async def activate(self):
+        """Activate the poll. Returns False if it was active already."""
+        return await self._flip('active', False, True)
+
+    async def _flip(self, field, old, new, extra=None):
+        setattr(self, field, new)
+        result = await self._get_collection().update_one(
+            {'_id': self.id, field: old}, {'$set': {field: new, **(extra or {})}}
+        )
+        if self._saved is not None:
+            self._saved = {**self._saved, field: new}
+        self.bot.poll_cache.invalidate(poll_id=self.id)
+        return result.modified_count > 0
+
     async def wizard_says(self, ctx, text, footer=True):
         embed = discord.Embed(title="Poll creation Wizard", description=text, color=SETTINGS.color)
         if footer:
@@ -224,6 +332,14 @@ class Poll:
             except InvalidInput:
                 await self.add_error(message, '**Keep the poll question between 3 and 400 valid characters**')
 
+    async def generate_short(self):
+        """Set a random label. If it is taken, insert_into_db picks another one."""
+        labels = []
+        while not labels:
+            labels = await generate_labels(self.bot, self.server.id)
+        self.short = labels[0]
+        self.short_generated = True
+
     async def set_short(self, ctx, force=None):
         """Set the label of the Poll."""
         async def get_valid(in_reply):
@@ -236,13 +352,15 @@ class Poll:
                 raise InvalidInput
             elif in_reply in ['open', 'closed', 'prepared']:
                 raise ReservedInput
-            elif await self.bot.db.polls.find_one({'server_id': str(self.server.id), 'short': in_reply}) is not None:
+            elif await self.bot.db.polls.find_one({'server_id': str(self.server.id), 'short': in_reply}) is not None \
+                    or await Archive.exists(self.bot, self.server.id, in_reply):
                 raise DuplicateInput
             elif min_len <= in_reply.__len__() <= max_len and in_reply.split(" ").__len__() == 1:
                 return in_reply
             else:
                 raise InvalidInput
 
+        self.short_generated = False
         try:
             self.short = await get_valid(force)
             return
@@ -307,7 +425,7 @@ class Poll:
             dt = await get_valid(force)
             self.activation = dt
             if self.activation != 0:
-                self.activation_tz = dt.utcoffset().total_seconds() / 3600
+                self.activation_tz = get_timezone_name(dt)
             self.active = False
             return
         except InputError:
@@ -331,7 +449,7 @@ class Poll:
                 if self.activation == 0:
                     await self.add_vaild(message, 'manually activated')
                 else:
-                    self.activation_tz = dt.utcoffset().total_seconds() / 3600
+                    self.activation_tz = get_timezone_name(dt)
                     await self.add_vaild(message, self.activation.strftime('%d-%b-%Y %H:%M %Z'))
                 self.active = False
                 break
@@ -787,7 +905,7 @@ class Poll:
             dt = await get_valid(force)
             self.duration = dt
             if self.duration != 0:
-                self.duration_tz = dt.utcoffset().total_seconds() / 3600
+                self.duration_tz = get_timezone_name(dt)
             return
         except InputError:
             pass
@@ -813,7 +931,7 @@ class Poll:
                 if self.duration == 0:
                     await self.add_vaild(message, 'until closed manually')
                 else:
-                    self.duration_tz = dt.utcoffset().total_seconds() / 3600
+                    self.duration_tz = get_timezone_name(dt)
                     await self.add_vaild(message, self.duration.strftime('%d-%b-%Y %H:%M %Z'))
                 break
             except InvalidInput:
@@ -910,18 +1028,10 @@ class Poll:
         return cmd
 
     async def to_dict(self):
-        if self.channel is None:
-            cid = 0
-        else:
-            cid = self.channel.id
-        if self.author is None:
-            aid = 0
-        else:
-            aid = self.author.id
-        return {
+        d = {
             'server_id': str(self.server.id),
-            'channel_id': str(cid),
-            'author': str(aid),
+            'channel_id': str(self.channel_id),
+            'author': str(self.author_id),
             'name': self.name,
             'short': self.short,
             'anonymous': self.anonymous,
@@ -941,16 +1051,34 @@ class Poll:
             'open': self.open,
             'active': self.active,
             'activation': self.activation,
-            'activation_tz': self.activation_tz,
-            'votes': self.votes
+            'activation_tz': self.activation_tz
         }
-
-    async def to_export(self):
-        """Create report and return string"""
-        # load all votes from database
-        await self.load_full_votes()
-        await self.load_vote_counts()
-        await self.load_unique_participants()
+        if self.fields is not None:
+            # don't overwrite the fields that weren't loaded
+            d = {k: v for k, v in d.items() if k in self.fields}
+        return d
+
+    async def get_member_name(self, user_id):
+        # member = self.server.get_member(int(user_id))
+        member = await self.bot.member_cache.get(self.server, int(user_id))
+        if not member:
+            name = "<Deleted User>"
+        else:
+            name = member.display_name
+        if not name:
+            name = member.name
+        return name
+
+    async def get_export_line(self, user_id, choice_text_list=None):
+        name = await self.get_member_name(user_id)
+        if choice_text_list is None:
+            return f'\n{name}'
+        return f'\n{name}: ' + ', '.join(choice_text_list)
+
+    async def iter_export(self):
+        """Create report in chunks, so it can be written while it is generated"""
+        # numbers from one aggregation, the votes themselves are streamed into the detailed sections
+        summary = await self.load_vote_summary()
         # build string for weights
         weight_str = 'No weights'
         if self.weights_roles.__len__() > 0:
@@ -970,140 +1098,159 @@ class Poll:
             elif votes == winning_votes:
                 winning_options.append(o)
         deadline_str = await self.get_deadline(string=True)
-        export = (f'--------------------------------------------\n'
-                  f'POLLMASTER DISCORD EXPORT\n'
-                  f'--------------------------------------------\n'
-                  f'Server name (ID): {self.server.name} ({self.server.id})\n'
-                  f'Owner of the poll: {self.author.name}\n'
-                  f'Time of creation: {self.time_created.strftime("%d-%b-%Y %H:%M %Z")}\n'
-                  f'--------------------------------------------\n'
-                  f'POLL SETTINGS\n'
-                  f'--------------------------------------------\n'
-                  f'Question / Name: {self.name}\n'
-                  f'Label: {self.short}\n'
-                  f'Anonymous: {"Yes" if self.anonymous else "No"}\n'
-                  f'# Choices: {"Multiple" if self.multiple_choice == 0 else self.multiple_choice}\n'
-                  f'Answer options: {", ".join(self.options_reaction)}\n'
-                  f'Allowed roles: {", ".join(self.roles) if self.roles.__len__() > 0 else "@everyone"}\n'
-                  f'Weights for roles: {weight_str}\n'
-                  f'Deadline: {deadline_str}\n'
-                  f'--------------------------------------------\n'
-                  f'POLL RESULTS\n'
-                  f'--------------------------------------------\n'
-                  f'Number of participants: {len(self.unique_participants)}\n'
-                  f'Raw results: {", ".join([str(o)+": "+str(self.vote_counts.get(i, 0)) for i,o in enumerate(self.options_reaction)])}\n'
-                  f'Weighted results: {", ".join([str(o)+": "+str(self.vote_counts_weighted.get(i, 0)) for i,o in enumerate(self.options_reaction)])}\n'
-                  f'Winning option{"s" if len(winning_options) > 1 else ""}: {", ".join(winning_options)} with {winning_votes} votes\n')
+        author = await self.get_author()
+        yield (f'--------------------------------------------\n'
+               f'POLLMASTER DISCORD EXPORT\n'
+               f'--------------------------------------------\n'
+               f'Server name (ID): {self.server.name} ({self.server.id})\n'
+               f'Owner of the poll: {author.name if author else "<Deleted User>"}\n'
+               f'Time of creation: {self.time_created.strftime("%d-%b-%Y %H:%M %Z")}\n'
+               f'--------------------------------------------\n'
+               f'POLL SETTINGS\n'
+               f'--------------------------------------------\n'
+               f'Question / Name: {self.name}\n'
+               f'Label: {self.short}\n'
+               f'Anonymous: {"Yes" if self.anonymous else "No"}\n'
+               f'# Choices: {"Multiple" if self.multiple_choice == 0 else self.multiple_choice}\n'
+               f'Answer options: {", ".join(self.options_reaction)}\n'
+               f'Allowed roles: {", ".join(self.roles) if self.roles.__len__() > 0 else "@everyone"}\n'
+               f'Weights for roles: {weight_str}\n'
+               f'Deadline: {deadline_str}\n'
+               f'--------------------------------------------\n'
+               f'POLL RESULTS\n'
+               f'--------------------------------------------\n'
+               f'Number of participants: {summary.participants}\n'
+               f'Raw results: {", ".join([str(o)+": "+str(self.vote_counts.get(i, 0)) for i,o in enumerate(self.options_reaction)])}\n'
+               f'Weighted results: {", ".join([str(o)+": "+str(self.vote_counts_weighted.get(i, 0)) for i,o in enumerate(self.options_reaction)])}\n'
+               f'Winning option{"s" if len(winning_options) > 1 else ""}: {", ".join(winning_options)} with {winning_votes} votes\n')
 
         if not self.anonymous:
-            export += '--------------------------------------------\n' \
-                      'DETAILED POLL RESULTS\n' \
-                      '--------------------------------------------'
-
-            for user_id in self.unique_participants:
-                # member = self.server.get_member(int(user_id))
-                member = await self.bot.member_cache.get(self.server, int(user_id))
-
-                if not member:
-                    name = "<Deleted User>"
-                else:
-                    name = member.display_name
-                if not name:
-                    name = member.name
-
-                export += f'\n{name}: '
-                # if self.votes[str(user_id)]['weight'] != 1:
-                #     export += f' (weight: {self.votes[str(user_id)]["weight"]})'
-                # export += ': ' + ', '.join([self.options_reaction[c] for c in self.votes[str(user_id)]['choices']])
-                choice_text_list = []
-
-                for vote in self.full_votes:
-                    if vote.user_id != user_id:
-                        continue
-
-                    choice_text = self.options_reaction[vote.choice]
-                    if vote.choice in self.survey_flags:
-                        choice_text += f' ({vote.answer}) '
-                    choice_text_list.append(choice_text)
-
-                # for choice in self.votes[str(user_id)]['choices']:
-                #     choice_text = self.options_reaction[choice]
-                #     if choice in self.survey_flags:
-                #         choice_text += " ("\
-                #                   + self.votes[str(user_id)]["answers"][self.survey_flags.index(choice)] \
-                #                   + ") "
-                #     choice_text_list.append(choice_text)
-
-                if choice_text_list:
-                    export += ', '.join(choice_text_list)
-
-            export += '\n'
+            yield '--------------------------------------------\n' \
+                  'DETAILED POLL RESULTS\n' \
+                  '--------------------------------------------'
+
+            # votes sorted by user, so the votes of every user are consecutive
+            user_id = None
+            choice_text_list = []
+            lines = 0
+            async for vote in self.iter_votes(['user_id', 'choice', 'answer'], sort='user'):
+                if vote['user_id'] != user_id:
+                    if user_id is not None:
+                        yield await self.get_export_line(user_id, choice_text_list)
+                        lines += 1
+                        if lines % EXPORT_BATCH_SIZE == 0:
+                            # member names mostly come from the cache, give the other shards a turn
+                            await asyncio.sleep(0)
+                    user_id = vote['user_id']
+                    choice_text_list = []
+
+                choice_text = self.options_reaction[vote['choice']]
+                if vote['choice'] in self.survey_flags:
+                    choice_text += f' ({vote["answer"]}) '
+                choice_text_list.append(choice_text)
+
+            if user_id is not None:
+                yield await self.get_export_line(user_id, choice_text_list)
+
+            yield '\n'
         else:
-            export += '--------------------------------------------\n' \
-                      'LIST OF PARTICIPANTS\n' \
-                      '--------------------------------------------'
-
-            for user_id in self.unique_participants:
-                # member = self.server.get_member(int(user_id))
-                member = await self.bot.member_cache.get(self.server, int(user_id))
-                if not member:
-                    name = "<Deleted User>"
-                else:
-                    name = member.display_name
-                if not name:
-                    name = member.name
-
-                export += f'\n{name}'
-                # if self.votes[str(user_id)]['weight'] != 1:
-                #     export += f' (weight: {self.votes[str(user_id)]["weight"]})'
-                # export += ': ' + ', '.join([self.options_reaction[c] for c in self.votes[str(user_id)]['choices']])
-            export += '\n'
+            yield '--------------------------------------------\n' \
+                  'LIST OF PARTICIPANTS\n' \
+                  '--------------------------------------------'
+
+            user_id = None
+            lines = 0
+            async for vote in self.iter_votes(['user_id'], sort='user'):
+                if vote['user_id'] == user_id:
+                    continue
+                user_id = vote['user_id']
+                yield await self.get_export_line(user_id)
+                lines += 1
+                if lines % EXPORT_BATCH_SIZE == 0:
+                    await asyncio.sleep(0)
+            yield '\n'
 
             if len(self.survey_flags) > 0:
-                export += '--------------------------------------------\n' \
-                          'CUSTOM ANSWERS (RANDOM ORDER)\n' \
-                          '--------------------------------------------'
+                yield '--------------------------------------------\n' \
+                      'CUSTOM ANSWERS (RANDOM ORDER)\n' \
+                      '--------------------------------------------'
                 for i, o in enumerate(self.options_reaction):
                     if i not in self.survey_flags:
                         continue
-                    custom_answers = []
-
-                    for vote in self.full_votes:
-                        if vote.choice == i and vote.answer != '':
-                            custom_answers.append(f'\n{vote.answer}')
-
-                    # for user_id in self.votes:
-                    #     if i in self.votes[str(user_id)]["choices"]:
-                    #         custom_answers.append(f'\n{self.votes[str(user_id)]["answers"][self.survey_flags.index(i)]}')
-
-                    export += "\n" + o + ":"
-                    if len(custom_answers) > 0:
-                        random.shuffle(custom_answers)  # randomize answers per question
-                        for answer in custom_answers:
-                            export += answer
-                            export += '\n'
+                    # only the answers of one option are held at a time
+                    answers = [f'\n{vote["answer"]}' async for vote in self.iter_votes(['answer'], choices=[i])
+                               if vote['answer'] != '']
+                    yield "\n" + o + ":"
+                    if len(answers) > 0:
+                        random.shuffle(answers)  # randomize answers per question
+                        yield '\n'.join(answers) + '\n'
                     else:
-                        export += "\nNo custom answers were submitted."
-                        export += '\n'
-
-        export += ('--------------------------------------------\n'
-                   'BOT DETAILS\n'
-                   '--------------------------------------------\n'
-                   'Creator: Newti#0654\n'
-                   'Link to invite, vote for or support Pollmaster:\n'
-                   'https://discordbots.org/bot/444514223075360800\n'
-                   '--------------------------------------------\n'
-                   'END OF FILE\n'
-                   '--------------------------------------------\n')
-        return export
-
-    async def export(self):
+                        yield "\nNo custom answers were submitted.\n"
+
+        yield ('--------------------------------------------\n'
+               'BOT DETAILS\n'
+               '--------------------------------------------\n'
+               'Creator: Newti#0654\n'
+               'Link to invite, vote for or support Pollmaster:\n'
+               'https://discordbots.org/bot/444514223075360800\n'
+               '--------------------------------------------\n'
+               'END OF FILE\n'
+               '--------------------------------------------\n')
+
+    async def iter_export_rows(self):
+        """One row per vote, streamed from the votes.
+        Rows of anonymous polls leave out who voted, when and the custom answers, and are sorted by choice."""
+        sort = 'choice' if self.anonymous else 'user'
+        lines = 0
+        async for vote in self.iter_votes(['user_id', 'choice', 'weight', 'answer', 'time'], sort=sort):
+            row = {
+                'user_id': '',
+                'name': '',
+                'choice': vote['choice'],
+                'option': self.options_reaction[vote['choice']],
+                'weight': vote['weight'],
+                'answer': '',
+                'time': ''
+            }
+            if not self.anonymous:
+                row['user_id'] = vote['user_id']
+                row['name'] = await self.get_member_name(vote['user_id'])
+                row['answer'] = vote['answer']
+                row['time'] = vote['time'].isoformat() if vote['time'] else ''
+            yield row
+            lines += 1
+            if lines % EXPORT_BATCH_SIZE == 0:
+                await asyncio.sleep(0)
+
+    async def iter_export_csv(self):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_COLUMNS)
+        async for row in self.iter_export_rows():
+            writer.writerow([row[c] for c in EXPORT_COLUMNS])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    async def iter_export_jsonl(self):
+        async for row in self.iter_export_rows():
+            yield json.dumps(row, ensure_ascii=False) + '\n'
+
+    async def export(self, fmt='txt'):
         """Create export file and return path"""
         if not self.open:
             clean_label = str(self.short).replace("/", "").replace(".", "")
-            fn = 'export/' + str(self.server.id) + '_' + clean_label + '.txt'
-            with codecs.open(fn, 'w', 'utf-8') as outfile:
-                outfile.write(await self.to_export())
+            fn = 'export/' + str(self.server.id) + '_' + clean_label + '.' + fmt
+            if fmt == 'csv':
+                chunks = self.iter_export_csv()
+            elif fmt == 'jsonl':
+                chunks = self.iter_export_jsonl()
+            else:
+                chunks = self.iter_export()
+            async with ExportWriter(self.bot.loop, fn) as writer:
+                async for chunk in chunks:
+                    await writer.write(chunk)
             return fn
         else:
             return None
@@ -1121,110 +1268,146 @@ class Poll:
                     break
 
     async def from_dict(self, d):
+        """Documents loaded with a projection only set the fields they contain.
+        The author, the channel and whether the options are emojis are resolved when they are first used.
+        A poll that is past its deadline or activation is closed or activated in memory only."""
         self.id = ObjectId(str(d['_id']))
+        self.fields = None if all(f in d for f in Poll.FIELDS) else set(d.keys())
+        self._saved = copy.deepcopy({f: d[f] for f in Poll.FIELDS if f in d})
         self.server = self.bot.get_guild(int(d['server_id']))
-        self.channel = self.bot.get_channel(int(d['channel_id']))
-        if self.server:
-            self.author = await self.bot.member_cache.get(self.server, int(d['author']))
-            # self.author = self.server.get_member(int(d['author']))
-        else:
-            self.author = None
-        self.name = d['name']
         self.short = d['short']
-        self.anonymous = d['anonymous']
-
-        # backwards compatibility
-        if 'hide_count' in d.keys():
-            self.hide_count = d['hide_count']
-        else:
-            self.hide_count = False
-
-        self.reaction = d['reaction']
-
-        # backwards compatibility for multiple choice
-        if isinstance(d['multiple_choice'], bool):
-            if d['multiple_choice']:
-                self.multiple_choice = 0
-            else:
-                self.multiple_choice = 1
-        else:
-            try:
-                self.multiple_choice = int(d['multiple_choice'])
-            except ValueError:
-                logger.exception('Multiple Choice not an int or bool.')
-                self.multiple_choice = 0 # default
-
-        self.options_reaction = d['options_reaction']
-        self.options_reaction_default = d['reaction_default']
+        self._channel = None
+        if 'channel_id' in d:
+            self.channel_id = int(d['channel_id'])
+        self._author = None
+        if 'author' in d:
+            self.author_id = int(d['author'])
+        # migrations/runner.py brought the documents to the current schema before the bot started
+        for field, attribute in Poll.ATTRIBUTES.items():
+            if field in d:
+                setattr(self, attribute, d[field])
+        self._options_reaction_emoji_only = None
 
-        # check if emoji only
-        self.set_emoji_only()
-
-        # self.options_traditional = d['options_traditional']
-
-        # backwards compatibility
-        if 'survey_flags' in d.keys():
-            self.survey_flags = d['survey_flags']
-        else:
-            self.survey_flags = []
-
-        self.roles = d['roles']
-        self.weights_roles = d['weights_roles']
-        self.weights_numbers = d['weights_numbers']
-        self.duration = d['duration']
-        self.duration_tz = d['duration_tz']
-        self.time_created = d['time_created']
+        self.cursor_pos = 0
 
-        self.activation = d['activation']
-        self.activation_tz = d['activation_tz']
-        self.active = d['active']
-        self.open = d['open']
+        if 'ballots' in d:
+            self.archive = ArchivedVotes.from_dict(d)
 
-        self.cursor_pos = 0
-        self.votes = d['votes']
+        if 'open' in d and 'duration' in d:
+            self.open = await self.is_open(update_db=False)
+        if 'active' in d and 'activation' in d:
+            self.active = await self.is_active(update_db=False)
 
-        self.open = await self.is_open()
-        self.active = await self.is_active()
+    def _get_collection(self):
+        return self.bot.db.polls_archive if self.archive is not None else self.bot.db.polls
 
     async def save_to_db(self):
-        await self.bot.db.polls.update_one({'server_id': str(self.server.id), 'short': str(self.short)},
-                                           {'$set': await self.to_dict()}, upsert=True)
+        """Save the fields that changed since the poll was loaded or saved. New polls are saved as a whole."""
+        if self.id is None:
+            await self.insert_into_db()
+            return
+        d = await self.to_dict()
+        if self._saved is None:
+            await self._get_collection().update_one({'_id': self.id}, {'$set': d})
+        else:
+            changes = {k: v for k, v in d.items() if k not in self._saved or self._saved[k] != v}
+            if not changes:
+                return
+            await self._get_collection().update_one({'_id': self.id}, {'$set': changes})
+        self._saved = copy.deepcopy(d)
+        self.bot.poll_cache.invalidate(self.server.id, self.short)
+
+    async def insert_into_db(self):
+        """Insert a new poll. The unique index on (server_id, short) rejects a label that is in use.
+        A random label is then replaced by another one. A label the user chose raises DuplicateInput,
+        so the user can choose again."""
+        labels = []
+        while True:
+            d = await self.to_dict()
+            try:
+                result = await self.bot.db.polls.insert_one(d)
+                break
+            except DuplicateKeyError:
+                if not self.short_generated:
+                    # taken after the wizard checked it
+                    raise DuplicateInput
+                while not labels:
+                    labels = await generate_labels(self.bot, self.server.id)
+                self.short = labels.pop()
+        self.id = result.inserted_id
+        d.pop('_id', None)
+        self._saved = copy.deepcopy(d)
+        self.bot.poll_cache.invalidate(self.server.id, self.short)
 
     @staticmethod
-    async def load_from_db(bot, server_id, short, ctx=None, ):
-        query = await bot.db.polls.find_one({'server_id': str(server_id), 'short': short})
+    async def load_from_db(bot, server_id, short, ctx=None, fields=None):
+        """Load a poll. With fields, only those fields are loaded, unless the cache has more of them."""
+        p = bot.poll_cache.get(server_id, short, fields)
+        if p is not None:
+            return p
+        query = await bot.db.polls.find_one({'server_id': str(server_id), 'short': short},
+                                            Poll.get_projection(fields))
+        if query is None:
+            query = await Archive.load(bot, server_id, short)
         if query is not None:
             p = Poll(bot, ctx, load=True)
             await p.from_dict(query)
+            bot.poll_cache.put(p)
             return p
         else:
             return None
 
+    async def get_full(self):
+        """The poll with all of its fields. A poll loaded with a projection is loaded again, usually from the cache."""
+        if self.fields is None:
+            return self
+        return await Poll.load_from_db(self.bot, self.server.id, self.short)
+
     async def load_votes_for_user(self, user_id):
+        if self.archive is not None:
+            return self.archive.get_votes_for_user(self.bot, user_id)
         return await Vote.load_votes_for_poll_and_user(self.bot, self.id, user_id)
 
-    async def load_unique_participants(self):
-        await self.load_full_votes()
-        voters = set()
-        for v in self.full_votes:
-            voters.add(v.user_id)
-        self.unique_participants = voters
+    async def iter_votes(self, fields=None, sort=None, choices=None):
+        if self.archive is not None:
+            for v in self.archive.iter_votes(fields, sort, choices):
+                yield v
+        else:
+            async for v in Vote.iter_votes_for_poll(self.bot, self.id, fields, sort, choices):
+                yield v
 
     async def load_vote_counts(self):
         if not self.vote_counts:
-            self.vote_counts = await Vote.load_vote_counts_for_poll(self.bot, self.id)
+            if self.archive is not None:
+                tally = self.archive.tally
+            else:
+                tally = await Tally.load(self.bot, self.id)
+            self.vote_counts = tally.counts
+            self.tally_version = tally.version
+            if len(self.weights_numbers) > 0:
+                self.vote_counts_weighted = tally.weighted
+            else:
+                self.vote_counts_weighted = self.vote_counts
 
-        if len(self.weights_numbers) > 0 and not self.vote_counts_weighted:
-            # find weighted totals
-            await self.load_full_votes()
-            for v in self.full_votes:
-                self.vote_counts_weighted[v.choice] = self.vote_counts_weighted.get(v.choice, 0) + v.weight
+    async def load_vote_summary(self):
+        """Load the vote counts straight from the votes without materializing them"""
+        if self.archive is not None:
+            summary = self.archive.get_summary()
+        else:
+            summary = await Vote.load_summary_for_poll(self.bot, self.id)
+        self.vote_counts = summary.counts
+        if len(self.weights_numbers) > 0:
+            self.vote_counts_weighted = summary.weighted
         else:
             self.vote_counts_weighted = self.vote_counts
+        return summary
 
     async def load_full_votes(self):
-        if not self.full_votes:
-            self.full_votes = await Vote.load_all_votes_for_poll(self.bot, self.id)
+        if self.full_votes is None:
+            if self.archive is not None:
+                self.full_votes = self.archive.get_columns()
+            else:
+                self.full_votes = await VoteColumns.load(self.bot, self.id)
 
     def add_field_custom(self, name, value, embed):
         """this is used to estimate the width of text and add empty embed fields for a cleaner report
@@ -1235,9 +1418,8 @@ class Poll:
         name = str(name)
         value = str(value)
 
-        nwidth = afm.string_width_height(unidecode(name))
-        vwidth = afm.string_width_height(unidecode(value))
-        w = max(nwidth[0], vwidth[0])
+        # estimated text width, used to adjust the layout of the embed
+        w = max(get_text_width(name), get_text_width(value))
 
         embed.add_field(name=name, value=value, inline=False if w > 12500 and self.cursor_pos % 2 == 1 else True)
         self.cursor_pos += 1
@@ -1250,6 +1432,17 @@ class Poll:
 
         return embed
 
+    async def get_render_version(self):
+        """Everything the embed of the poll depends on. Polls with the same version render the same embed."""
+        await self.load_vote_counts()
+        return (
+            self.tally_version, await self.is_open(), await self.is_active(), self.short, self.name,
+            self.anonymous, self.hide_count, self.multiple_choice, self.options_reaction_default,
+            self.options_reaction_emoji_only, tuple(self.options_reaction), tuple(self.survey_flags),
+            tuple(self.roles), tuple(self.weights_roles), tuple(self.weights_numbers),
+            self.duration, self.duration_tz, self.activation, self.activation_tz
+        )
+
     async def generate_embed(self):
         """Generate Discord Report"""
         self.cursor_pos = 0
@@ -1350,6 +1543,7 @@ class Poll:
 
     async def post_embed(self, destination):
         msg = await destination.send(embed=await self.generate_embed())
+        await self.bot.poll_index.add(msg, self)
         if self.reaction and await self.is_open() and await self.is_active():
             if self.options_reaction_default:
                 for r in self.options_reaction:
@@ -1377,23 +1571,7 @@ class Poll:
             dt = self.duration
             if dt.tzinfo is None or dt.tzinfo.utcoffset(dt) is None:
                 dt = pytz.utc.localize(dt)
-            if isinstance(self.duration_tz, float):
-                tz = possible_timezones(self.duration_tz, common_only=True)
-                if not tz:
-                    tz = pytz.timezone('UTC')
-                else:
-                    # choose one valid timezone with the offset
-                    try:
-                        tz = pytz.timezone(tz[0])
-                    except UnknownTimeZoneError:
-                        tz = pytz.UTC
-            else:
-                try:
-                    tz = pytz.timezone(self.duration_tz)
-                except UnknownTimeZoneError:
-                    tz = pytz.UTC
-
-            return dt.astimezone(tz)
+            return dt.astimezone(get_timezone(self.duration_tz))
 
     def get_activation_with_tz(self):
         if self.activation == 0:
@@ -1402,17 +1580,7 @@ class Poll:
             dt = self.activation
             if dt.tzinfo is None or dt.tzinfo.utcoffset(dt) is None:
                 dt = pytz.utc.localize(dt)
-            if isinstance(self.activation_tz, float):
-                tz = possible_timezones(self.activation_tz, common_only=True)
-                if not tz:
-                    tz = pytz.timezone('UTC')
-                else:
-                    # choose one valid timezone with the offset
-                    tz = pytz.timezone(tz[0])
-            else:
-                tz = pytz.timezone(self.activation_tz)
-
-            return dt.astimezone(tz)
+            return dt.astimezone(get_timezone(self.activation_tz))
 
     async def get_deadline(self, string=False):
         if self.duration == 0:
@@ -1481,32 +1649,25 @@ class Poll:
             if len(valid_weights) > 0:
                 weight = max(valid_weights)
 
-        # unvote for anon and hidden count
-        if self.anonymous or self.hide_count:
-            vote = await Vote.load_from_db(self.bot, self.id, user.id, choice)
-            if vote:
-                await vote.delete_from_db()
-                await self.refresh(message)
-                return
-
-        # check if already voted for the same choice
-        votes = await self.load_votes_for_user(user.id)
-        for v in votes:
-            if v.choice == choice:
-                return  # already voted
-
-        # check if max votes exceeded
-        if 0 < self.multiple_choice <= len(votes):
+        # commit, for anon and hidden count voting again removes the vote
+        outcome = await Vote.commit(self.bot, self.id, user.id, choice, weight, limit=self.multiple_choice,
+                                    toggle=self.anonymous or self.hide_count)
+        if outcome.status == VoteOutcome.TOGGLED_OFF:
+            await self.refresh(message)
+            return
+        elif outcome.status == VoteOutcome.DUPLICATE:
+            return  # already voted
+        elif outcome.status == VoteOutcome.LIMIT_REACHED:
             say_text = f'You have reached the **maximum choices of {self.multiple_choice}** for this poll. ' \
                 f'Before you can vote again, you need to unvote one of your choices.\n' \
                 f'Your current choices are:\n'
-            for v in votes:
+            for c in outcome.choices:
                 if self.options_reaction_default:
-                    say_text += f'{self.options_reaction[v.choice]}\n'
+                    say_text += f'{self.options_reaction[c]}\n'
                 else:
                     if not self.options_reaction_emoji_only:
-                        say_text += f'{AZ_EMOJIS[v.choice]} '
-                    say_text += f'{self.options_reaction[v.choice]}\n'
+                        say_text += f'{AZ_EMOJIS[c]} '
+                    say_text += f'{self.options_reaction[c]}\n'
             embed = discord.Embed(title='', description=say_text, colour=SETTINGS.color)
             embed.set_author(name='Pollmaster', icon_url=SETTINGS.author_icon)
             self.bot.loop.create_task(user.send(embed=embed))
@@ -1523,13 +1684,12 @@ class Poll:
             )
             if not answer or answer.lower() == "-":
                 answer = "No Answer"
+            outcome.vote.answer = answer
+            await outcome.vote.save_to_db()
 
         if self.anonymous and self.hide_count:
             self.bot.loop.create_task(user.send(f'Your vote for **{self.options_reaction[choice]}** has been counted.'))
 
-        # commit
-        vote = Vote(self.bot, self.id, user.id, choice, weight, answer)
-        await vote.save_to_db()
         if not self.hide_count:
             await self.refresh(message)
 
@@ -1558,9 +1718,7 @@ class Poll:
         if choice == 'invalid':
             return
 
-        vote = await Vote.load_from_db(self.bot, self.id, user.id, choice)
-        if vote:
-            await vote.delete_from_db()
+        await Vote.retract(self.bot, self.id, user.id, choice)
 
         if not self.hide_count:
             await self.refresh(message)
@@ -1573,13 +1731,6 @@ class Poll:
         except AttributeError:
             return False
 
-    async def refresh(self, message, await_=False, force=False):
-        # dont refresh if there was a refresh in the past 5 seconds
-        if not force and self.bot.refresh_blocked.get(str(self.id), 0)-time.time() > 0:
-            self.bot.refresh_queue[str(self.id)] = message
-            return
-        self.bot.refresh_blocked[str(self.id)] = time.time() + 5
-        if await_:
-            await message.edit(embed=await self.generate_embed())
-        else:
-            self.bot.loop.create_task(message.edit(embed=await self.generate_embed()))
+    async def refresh(self, message, force=False):
+        # edits are debounced, the scheduler edits the message at most once per window
+        await self.bot.refresh_scheduler.schedule(self, message, force=force)
@@ -0,0 +1,98 @@
+from bson import ObjectId
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+
+class Tally:
+    """Materialized vote counts of a poll. Kept up to date with $inc whenever a vote is added or removed,
+    so rendering a poll reads one small document instead of aggregating all votes."""
+
+    def __init__(self, poll_id: ObjectId, counts=None, weighted=None, voters=0, version=0):
+        self.poll_id = poll_id
+        self.counts = counts if counts is not None else {}
+        self.weighted = weighted if weighted is not None else {}
+        self.voters = voters
+        self.version = version
+
+    @staticmethod
+    def from_dict(d):
+        return Tally(
+            d['_id'],
+            {int(c): n for c, n in d.get('counts', {}).items()},
+            {int(c): w for c, w in d.get('weighted', {}).items()},
+            d.get('voters', 0),
+            d.get('v', 0)
+        )
+
+    @staticmethod
+    def get_increment(choice: int, count: int, weight, voters: int):
+        return {
+            f'counts.{choice}': count,
+            f'weighted.{choice}': weight,
+            'voters': voters,
+            'v': 1
+        }
+
+    @staticmethod
+    async def record(bot, poll_id: ObjectId, choice: int, count: int, weight, voters: int = 0):
+        """Add (or with negative numbers remove) votes for a choice, without write-behind.
+        The caller holds the poll's lock of the vote buffer since it wrote the ballot."""
+        await bot.db.tallies.update_one(
+            {'_id': poll_id},
+            {'$inc': Tally.get_increment(choice, count, weight, voters)},
+            upsert=True
+        )
+
+    @staticmethod
+    async def load(bot, poll_id: ObjectId):
+        await bot.legacy_votes.upgrade(poll_id)
+        await bot.vote_buffer.flush(poll_id)
+        query = await bot.db.tallies.find_one({'_id': poll_id})
+        if query is None or query.get('stale'):
+            # polls from before tallies existed, or with legacy votes merged into their ballots
+            return await Tally.rebuild(bot, poll_id)
+        return Tally.from_dict(query)
+
+    @staticmethod
+    async def rebuild(bot, poll_id: ObjectId, retries=5):
+        """Recompute the tally from the ballots.
+        While the poll's lock is held no ballot change of this cluster is written without its increment,
+        so the ballots and the tally match. Increments written by others while the ballots are counted change the
+        version, the counts are then only stored if the version is still the one they were counted at."""
+        await bot.legacy_votes.upgrade(poll_id)
+        async with bot.vote_buffer.lock(poll_id):
+            await bot.vote_buffer.flush(poll_id, locked=True)
+            for attempt in range(retries + 1):
+                current = await bot.db.tallies.find_one({'_id': poll_id}, {'v': True})
+                pipeline = [
+                    {"$match": {'poll_id': poll_id}},
+                    {"$unwind": "$choices"},
+                    {"$group": {"_id": "$choices", "count": {"$sum": 1}, "weighted": {"$sum": "$weight"}}}
+                ]
+                counts = {}
+                weighted = {}
+                async for q in bot.db.ballots.aggregate(pipeline):
+                    counts[q['_id']] = q['count']
+                    weighted[q['_id']] = q['weighted']
+                voters = await bot.db.ballots.count_documents({'poll_id': poll_id, 'choices.0': {'$exists': True}})
+
+                query = {'_id': poll_id}
+                if attempt < retries:
+                    query['v'] = current.get('v', 0) if current else {'$exists': False}
+                try:
+                    result = await bot.db.tallies.find_one_and_update(
+                        query,
+                        {'$set': {
+                            'counts': {str(c): n for c, n in counts.items()},
+                            'weighted': {str(c): w for c, w in weighted.items()},
+                            'voters': voters
+                        }, '$unset': {'stale': ''}, '$inc': {'v': 1}},
+                        upsert=current is None or attempt == retries,
+                        return_document=ReturnDocument.AFTER
+                    )
+                except DuplicateKeyError:
+                    # the tally was created meanwhile
+                    continue
+                if result is not None:
+                    return Tally.from_dict(result)
+            return Tally.from_dict(await bot.db.tallies.find_one({'_id': poll_id}))
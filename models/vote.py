@@ -1,4 +1,35 @@
-from bson import ObjectId
+import datetime
+
+from bson import ObjectId, Int64
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from models.tally import Tally
+
+
+class VoteOutcome:
+    """Result of Vote.commit"""
+    ACCEPTED = 'accepted'
+    DUPLICATE = 'duplicate'
+    LIMIT_REACHED = 'limit reached'
+    TOGGLED_OFF = 'toggled off'
+
+    def __init__(self, status, choices=None, vote=None):
+        self.status = status
+        # choices of the user before the commit (for a rejected vote this is the current state)
+        self.choices = choices if choices is not None else []
+        self.vote = vote
+
+
+class VoteSummary:
+    """Result of Vote.load_summary_for_poll"""
+
+    def __init__(self, counts=None, weighted=None, voters=None, participants=0):
+        self.counts = counts if counts is not None else {}
+        self.weighted = weighted if weighted is not None else {}
+        # number of users that voted for a choice
+        self.voters = voters if voters is not None else {}
+        self.participants = participants
 
 
 class Vote:
@@ -21,56 +52,188 @@ class Vote:
         self.answer = answer
 
     @staticmethod
-    async def load_from_db(bot, poll_id: ObjectId, user_id, choice: int):
-        user_id = str(user_id)
-        query = await bot.db.votes.find_one(
-            {'poll_id': poll_id, 'user_id': user_id, 'choice': choice})
-        if query is not None:
-            v = Vote(bot, poll_id, user_id, choice, query['weight'], query['answer'], query['_id'])
-            return v
-        else:
-            return None
+    def from_ballot(bot, ballot, choices=None):
+        """The votes of a ballot, optionally only the ones for some choices"""
+        answers = ballot.get('answers', {})
+        return [Vote(bot, ballot['poll_id'], ballot['user_id'], c, ballot.get('weight', 1), answers.get(str(c), ''))
+                for c in ballot.get('choices', []) if choices is None or c in choices]
 
     @staticmethod
-    async def load_all_votes_for_poll(bot, poll_id: ObjectId,):
-        query = bot.db.votes.find({'poll_id': poll_id})
-        if query is not None:
-            votes = [Vote(bot, poll_id, v['user_id'], v['choice'], v['weight'], v['answer'], v['_id'])
-                     async for v in query]
-            return votes
-        else:
-            return None
+    async def iter_votes_for_poll(bot, poll_id: ObjectId, fields=None, sort=None, choices=None, batch_size=1000):
+        """Stream the votes of a poll as documents instead of building a list of Vote objects.
+        fields: only return these fields
+        sort: 'user' or 'choice'
+        choices: only return votes for these choices
+        The time of votes from before vote times were stored is the time the ballot was created."""
+        await bot.legacy_votes.upgrade(poll_id)
+        await bot.vote_buffer.flush(poll_id)
+        match = {'poll_id': poll_id}
+        if choices is not None:
+            match['mask'] = {'$bitsAnySet': list(choices)}
+        pipeline = [{"$match": match}]
+        if sort == 'user':
+            # the votes of a user stay together when the ballot is unwound
+            pipeline.append({"$sort": {'user_id': 1}})
+        pipeline += [
+            {"$project": {'user_id': True, 'choices': True, 'weight': True, 'answers': True, 'times': True}},
+            {"$unwind": "$choices"}
+        ]
+        if choices is not None:
+            pipeline.append({"$match": {'choices': {'$in': list(choices)}}})
+        if sort == 'choice':
+            pipeline.append({"$sort": {'choices': 1, 'user_id': 1}})
+        async for b in bot.db.ballots.aggregate(pipeline, allowDiskUse=True, batchSize=batch_size):
+            d = {
+                'user_id': b['user_id'],
+                'choice': b['choices'],
+                'weight': b.get('weight', 1),
+                'answer': b.get('answers', {}).get(str(b['choices']), ''),
+                'time': b.get('times', {}).get(str(b['choices'])) or b['_id'].generation_time.replace(tzinfo=None)
+            }
+            if fields is not None:
+                d = {f: d[f] for f in fields}
+            yield d
 
     @staticmethod
-    async def load_vote_counts_for_poll(bot, poll_id: ObjectId,):
+    async def load_summary_for_poll(bot, poll_id: ObjectId):
+        """Counts, weighted counts and voters per choice plus the number of participants, in one aggregation.
+        Nothing but the results leaves the database."""
+        await bot.legacy_votes.upgrade(poll_id)
+        await bot.vote_buffer.flush(poll_id)
         pipeline = [
             {"$match": {'poll_id': poll_id}},
-            {"$group": {"_id": "$choice", "count": {"$sum": 1}}}
+            {"$facet": {
+                # a ballot holds every choice once, so the count of a choice is also its number of voters
+                "choices": [
+                    {"$unwind": "$choices"},
+                    {"$group": {"_id": "$choices", "count": {"$sum": 1}, "weighted": {"$sum": "$weight"}}}
+                ],
+                "participants": [{"$match": {'choices.0': {'$exists': True}}}, {"$count": "count"}]
+            }}
         ]
-        query = bot.db.votes.aggregate(pipeline)
-        result = {}
-        async for q in query:
-            result[q['_id']] = q['count']
-        return result
+        summary = VoteSummary()
+        async for q in bot.db.ballots.aggregate(pipeline, allowDiskUse=True):
+            for c in q['choices']:
+                summary.counts[c['_id']] = c['count']
+                summary.weighted[c['_id']] = c['weighted']
+                summary.voters[c['_id']] = c['count']
+            if q['participants']:
+                summary.participants = q['participants'][0]['count']
+        return summary
 
     @staticmethod
     async def load_votes_for_poll_and_user(bot, poll_id: ObjectId, user_id):
-        user_id = str(user_id)
-        query = bot.db.votes.find({'poll_id': poll_id, 'user_id': user_id})
+        await bot.legacy_votes.upgrade(poll_id)
+        if bot.vote_buffer.enabled:
+            ballot = await bot.vote_buffer.load_ballot(poll_id, user_id)
+            return Vote.from_ballot(bot, {'poll_id': poll_id, 'user_id': str(user_id), **ballot})
+        query = await bot.db.ballots.find_one({'poll_id': poll_id, 'user_id': str(user_id)})
         if query is not None:
-            votes = [Vote(bot, poll_id, v['user_id'], v['choice'], v['weight'], v['answer'], v['_id'])
-                     async for v in query]
-            return votes
+            return Vote.from_ballot(bot, query)
         else:
-            return None
+            return []
 
     @staticmethod
-    async def load_number_of_voters_for_poll(bot, poll_id: ObjectId):
-        query = await bot.db.votes.distinct('user_id', {'poll_id': poll_id})
-        if query:
-            return len(query)
-        else:
-            return 0
+    async def commit(bot, poll_id: ObjectId, user_id, choice: int, weight=1, answer='', limit=0, toggle=False):
+        """Add a vote if the user hasn't voted for the choice and has choices left.
+        With toggle, voting for a choice again removes the vote.
+        The weight of the first vote holds for all votes of the ballot. The time of every vote is kept for exports."""
+        await bot.legacy_votes.upgrade(poll_id)
+        user_id = str(user_id)
+        if not bot.vote_buffer.enabled:
+            # the ballot and the tally are written together, see Tally.rebuild
+            async with bot.vote_buffer.lock(poll_id):
+                return await Vote._commit(bot, poll_id, user_id, choice, weight, answer, limit, toggle)
+
+        # write-behind: the rules are checked against the known ballot and the change is buffered
+        ballot = await bot.vote_buffer.load_ballot(poll_id, user_id)
+        choices = list(ballot['choices'])
+        if choice in choices:
+            if toggle:
+                bot.vote_buffer.unvote(poll_id, user_id, choice)
+                return VoteOutcome(VoteOutcome.TOGGLED_OFF, choices)
+            return VoteOutcome(VoteOutcome.DUPLICATE, choices)
+        if 0 < limit <= len(choices):
+            return VoteOutcome(VoteOutcome.LIMIT_REACHED, choices)
+        weight = bot.vote_buffer.vote(poll_id, user_id, choice, weight, answer)
+        return VoteOutcome(VoteOutcome.ACCEPTED, choices, Vote(bot, poll_id, user_id, choice, weight, answer))
+
+    @staticmethod
+    async def _commit(bot, poll_id: ObjectId, user_id: str, choice: int, weight, answer, limit, toggle):
+        """The rules are enforced by one conditional upsert on the user's ballot (unique per poll and user).
+        If it doesn't match, the upsert fails with a duplicate key and the ballot is read to tell why."""
+        query = {'poll_id': poll_id, 'user_id': user_id, 'choices': {'$ne': choice}}
+        if limit > 0:
+            # less than limit choices
+            query[f'choices.{limit - 1}'] = {'$exists': False}
+        update = {
+            '$addToSet': {'choices': choice},
+            '$bit': {'mask': {'or': Int64(1 << choice)}},
+            '$set': {f'times.{choice}': datetime.datetime.utcnow()},
+            '$setOnInsert': {'weight': weight}
+        }
+        if answer:
+            update['$set'][f'answers.{choice}'] = answer
+        try:
+            before = await bot.db.ballots.find_one_and_update(
+                query,
+                update,
+                projection={'choices': True, 'weight': True},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE
+            )
+        except DuplicateKeyError:
+            ballot = await bot.db.ballots.find_one({'poll_id': poll_id, 'user_id': user_id}, {'choices': True})
+            choices = ballot.get('choices', []) if ballot else []
+            if choice not in choices:
+                return VoteOutcome(VoteOutcome.LIMIT_REACHED, choices)
+            if toggle and await Vote._retract(bot, poll_id, user_id, choice):
+                return VoteOutcome(VoteOutcome.TOGGLED_OFF, choices)
+            return VoteOutcome(VoteOutcome.DUPLICATE, choices)
+
+        choices = before.get('choices', []) if before else []
+        if before is not None:
+            weight = before.get('weight', weight)
+        vote = Vote(bot, poll_id, user_id, choice, weight, answer)
+        await Tally.record(bot, poll_id, choice, 1, weight, 0 if choices else 1)
+        return VoteOutcome(VoteOutcome.ACCEPTED, choices, vote)
+
+    @staticmethod
+    async def retract(bot, poll_id: ObjectId, user_id, choice: int):
+        """Remove a vote, returns False if the user didn't vote for the choice"""
+        await bot.legacy_votes.upgrade(poll_id)
+        user_id = str(user_id)
+        if not bot.vote_buffer.enabled:
+            async with bot.vote_buffer.lock(poll_id):
+                return await Vote._retract(bot, poll_id, user_id, choice)
+
+        ballot = await bot.vote_buffer.load_ballot(poll_id, user_id)
+        if choice not in ballot['choices']:
+            return False
+        bot.vote_buffer.unvote(poll_id, user_id, choice)
+        return True
+
+    @staticmethod
+    async def _retract(bot, poll_id: ObjectId, user_id: str, choice: int):
+        before = await bot.db.ballots.find_one_and_update(
+            {'poll_id': poll_id, 'user_id': user_id, 'choices': choice},
+            {
+                '$pull': {'choices': choice},
+                '$bit': {'mask': {'and': Int64(~(1 << choice))}},
+                '$unset': {f'answers.{choice}': '', f'times.{choice}': ''}
+            },
+            projection={'choices': True, 'weight': True},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            return False
+        last = len(before['choices']) == 1
+        if last:
+            # only if no vote was added meanwhile
+            await bot.db.ballots.delete_one({'_id': before['_id'], 'choices': {'$size': 0}})
+        weight = before.get('weight', 1)
+        await Tally.record(bot, poll_id, choice, -1, -weight, -1 if last else 0)
+        return True
 
     def to_dict(self):
         return ({
@@ -82,14 +245,15 @@ class Vote:
         })
 
     async def save_to_db(self):
-        await self.bot.db.votes.update_one(
-            {'poll_id': self.poll_id, 'user_id': str(self.user_id), 'choice': self.choice},
-            {'$set': self.to_dict()},
-            upsert=True
+        """Store the answer of the vote on the ballot (the vote itself is added by commit)"""
+        if self.bot.vote_buffer.enabled:
+            await self.bot.vote_buffer.set_answer(self.poll_id, self.user_id, self.choice, self.answer)
+            return
+        if self.answer:
+            update = {'$set': {f'answers.{self.choice}': self.answer}}
+        else:
+            update = {'$unset': {f'answers.{self.choice}': ''}}
+        await self.bot.db.ballots.update_one(
+            {'poll_id': self.poll_id, 'user_id': self.user_id, 'choices': self.choice},
+            update
         )
-
-    async def delete_from_db(self):
-        if self._id:
-            self.bot.db.votes.delete_one({'_id': self._id})
-
-
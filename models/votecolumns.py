@@ -0,0 +1,59 @@
+from array import array
+
+from bson import ObjectId
+
+from models.vote import Vote
+
+
+class VoteColumns:
+    """All votes of a poll, stored column by column in typed arrays instead of one Vote object per vote.
+    A vote takes about 18 bytes (plus its answer, if it has one) instead of a few hundred."""
+
+    def __init__(self):
+        self.user_ids = array('Q')
+        self.choices = array('H')
+        self.weights = array('d')
+        # row -> answer, only for votes with an answer
+        self.answers = {}
+
+    def __len__(self):
+        return len(self.choices)
+
+    def __iter__(self):
+        """Rows as (user_id, choice, weight, answer)"""
+        for row in range(len(self.choices)):
+            yield self.get(row)
+
+    def get(self, row):
+        return self.user_ids[row], self.choices[row], self.weights[row], self.answers.get(row, '')
+
+    def append(self, user_id, choice: int, weight=1, answer=''):
+        if answer:
+            self.answers[len(self.choices)] = answer
+        self.user_ids.append(int(user_id))
+        self.choices.append(choice)
+        self.weights.append(weight)
+
+    @staticmethod
+    async def load(bot, poll_id: ObjectId):
+        columns = VoteColumns()
+        async for v in Vote.iter_votes_for_poll(bot, poll_id, ['user_id', 'choice', 'weight', 'answer']):
+            columns.append(v['user_id'], v['choice'], v.get('weight', 1), v.get('answer', ''))
+        return columns
+
+    def by_choice(self):
+        """choice -> rows of the votes for it"""
+        return self._group(self.choices)
+
+    def by_user(self):
+        """user id -> rows of the user's votes"""
+        return self._group(self.user_ids)
+
+    def _group(self, column):
+        groups = {}
+        for row, key in enumerate(column):
+            group = groups.get(key)
+            if group is None:
+                group = groups[key] = array('I')
+            group.append(row)
+        return groups
@@ -7,12 +7,22 @@ import discord
 import logging
 
 
+from essentials.garbagecollector import GarbageCollector
+from essentials.indexes import ensure_indexes
+from essentials.legacyvotes import LegacyVotes
+from essentials.membercache import MemberCache
 from essentials.messagecache import MessageCache
 from discord.ext import commands
 from motor.motor_asyncio import AsyncIOMotorClient
 
 from essentials.multi_server import get_pre
+from essentials.pollcache import PollCache
+from essentials.pollindex import PollIndex
+from essentials.reactioncleanup import ReactionCleanup
+from essentials.refreshscheduler import RefreshScheduler
 from essentials.settings import SETTINGS
+from essentials.votebuffer import VoteBuffer
+from migrations.runner import get_pending_migrations, run_required_migrations
 
 bot_config = {
     'command_prefix': get_pre,
@@ -24,12 +34,29 @@ bot_config = {
     'max_messages': 15000
 }
 
-bot = commands.AutoShardedBot(**bot_config)
+
+class Pollmaster(commands.AutoShardedBot):
+    async def close(self):
+        # write the votes of the last flush window before the connection goes away
+        await self.vote_buffer.close()
+        await super().close()
+
+
+bot = Pollmaster(**bot_config)
 bot.remove_command('help')
 
-bot.message_cache = MessageCache(bot)
-bot.refresh_blocked = {}
-bot.refresh_queue = {}
+bot.message_cache = MessageCache(bot, SETTINGS.message_cache_size, SETTINGS.message_cache_ttl)
+bot.member_cache = MemberCache(SETTINGS.member_cache_size, SETTINGS.member_cache_ttl,
+                               SETTINGS.member_cache_negative_ttl)
+bot.poll_index = PollIndex(bot)
+bot.poll_cache = PollCache(SETTINGS.poll_cache_size, SETTINGS.poll_cache_ttl)
+bot.legacy_votes = LegacyVotes(bot)
+bot.vote_buffer = VoteBuffer(bot, SETTINGS.vote_write_behind, SETTINGS.vote_flush_delay,
+                             SETTINGS.vote_ballot_cache_size)
+bot.refresh_scheduler = RefreshScheduler(bot)
+bot.reaction_cleanup = ReactionCleanup(bot)
+bot.garbage_collector = GarbageCollector(bot, SETTINGS.gc_batch_size, SETTINGS.gc_pause,
+                                        SETTINGS.gc_grace_days * 24 * 3600)
 
 # logger
 # create logger with 'spam_application'
@@ -49,7 +76,7 @@ ch.setFormatter(formatter)
 logger.addHandler(fh)
 logger.addHandler(ch)
 
-extensions = ['cogs.config', 'cogs.poll_controls', 'cogs.help', 'cogs.db_api', 'cogs.admin']
+extensions = ['cogs.config', 'cogs.poll_controls', 'cogs.help', 'cogs.db_api', 'cogs.admin', 'cogs.maintenance']
 for ext in extensions:
     bot.load_extension(ext)
 
@@ -101,6 +128,18 @@ async def on_ready():
 
     # cache prefixes
     bot.pre = {entry['_id']: entry.get('prefix', 'pm!') async for entry in bot.db.config.find({}, {'_id', 'prefix'})}
+    try:
+        await ensure_indexes(bot.db)
+        await run_required_migrations(bot.db)
+    except Exception:
+        logger.exception('The database is not ready, shutting down.')
+        await bot.close()
+        return
+    pending = await get_pending_migrations(bot.db)
+    if pending:
+        logger.error(f'Migrations not done: {", ".join(pending)}. Run python -m migrations.runner.')
+    await bot.legacy_votes.check()
+    await bot.poll_index.load([g.id for g in bot.guilds])
 
     await bot.change_presence(activity=discord.Activity(type=discord.ActivityType.listening, name="pm!help"))
 
@@ -161,5 +200,24 @@ async def on_guild_join(server):
             upsert=True
         )
         bot.pre[str(server.id)] = 'pm!'
+    await bot.garbage_collector.cancel_guild(server.id)
+    await bot.poll_index.load([server.id])
+
+
+@bot.event
+async def on_guild_remove(server):
+    await bot.garbage_collector.enqueue_guild(server.id)
+    bot.member_cache.forget_guild(server.id)
+
+
+@bot.event
+async def on_member_update(before, after):
+    bot.member_cache.update(after)
+
+
+@bot.event
+async def on_member_remove(member):
+    bot.member_cache.remove(member.guild.id, member.id)
+
 
 bot.run(SETTINGS.bot_token)
@@ -0,0 +1,45 @@
+import os
+
+
+class ExportWriter:
+    """Writes an export file chunk by chunk. The text is collected until it reaches chunk_size characters
+    and then written from the default executor, so the event loop never waits for the disk.
+    If the export fails, the incomplete file is removed."""
+
+    def __init__(self, loop, fn, chunk_size=64 * 1024):
+        self._loop = loop
+        self.fn = fn
+        self._chunk_size = chunk_size
+        self._parts = []
+        self._size = 0
+        self._file = None
+
+    async def __aenter__(self):
+        # line endings are written as they are
+        self._file = await self._loop.run_in_executor(
+            None, lambda: open(self.fn, 'w', encoding='utf-8', newline='')
+        )
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        try:
+            if exc_type is None:
+                await self.flush()
+        finally:
+            await self._loop.run_in_executor(None, self._file.close)
+            if exc_type is not None:
+                await self._loop.run_in_executor(None, os.remove, self.fn)
+
+    async def write(self, text):
+        self._parts.append(text)
+        self._size += len(text)
+        if self._size >= self._chunk_size:
+            await self.flush()
+
+    async def flush(self):
+        if not self._parts:
+            return
+        data = ''.join(self._parts)
+        self._parts = []
+        self._size = 0
+        await self._loop.run_in_executor(None, self._file.write, data)
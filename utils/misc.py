@@ -1,4 +1,5 @@
 import argparse
+import functools
 
 import pytz
 import datetime as dt
@@ -30,24 +31,54 @@ class CustomFormatter(argparse.RawTextHelpFormatter):
             return ', '.join(parts)
 
 
-def possible_timezones(tz_offset, common_only=True):
-    # pick one of the timezone collections
-    timezones = pytz.common_timezones if common_only else pytz.all_timezones
+def _get_standard_offset(tz):
+    """Offset of a timezone outside of daylight saving time, in seconds"""
+    null_delta = dt.timedelta(0, 0)
+    non_dst_offset = getattr(tz, '_transition_info', [[null_delta]])[-1]
+    return int(non_dst_offset[0].total_seconds())
 
-    # convert the float hours offset to a timedelta
-    offset_days, offset_seconds = 0, int(tz_offset * 3600)
-    if offset_seconds < 0:
-        offset_days = -1
-        offset_seconds += 24 * 3600
-    desired_delta = dt.timedelta(offset_days, offset_seconds)
 
-    # Loop through the timezones and find any with matching offsets
-    null_delta = dt.timedelta(0, 0)
-    results = []
+def _build_offset_table(timezones):
+    """offset in seconds -> names of the timezones with that offset, in the order of the collection"""
+    table = {}
     for tz_name in timezones:
-        tz = pytz.timezone(tz_name)
-        non_dst_offset = getattr(tz, '_transition_info', [[null_delta]])[-1]
-        if desired_delta == non_dst_offset[0]:
-            results.append(tz_name)
+        table.setdefault(_get_standard_offset(pytz.timezone(tz_name)), []).append(tz_name)
+    return table
+
+
+# built once, the full collection only when it is needed
+_OFFSET_TABLES = {True: _build_offset_table(pytz.common_timezones)}
+
+
+def _get_offset_seconds(tz_offset):
+    # convert the float hours offset to seconds
+    return int(tz_offset * 3600)
+
+
+def possible_timezones(tz_offset, common_only=True):
+    table = _OFFSET_TABLES.get(common_only)
+    if table is None:
+        table = _OFFSET_TABLES[common_only] = _build_offset_table(pytz.all_timezones)
+    return list(table.get(_get_offset_seconds(tz_offset), []))
+
+
+@functools.lru_cache(maxsize=None)
+def get_timezone(tz):
+    """Timezone for a stored tz value: a canonical name, or the hours offset of polls created before names were stored.
+    An offset maps to the first common timezone with that offset, or UTC."""
+    if isinstance(tz, str):
+        try:
+            return pytz.timezone(tz)
+        except pytz.UnknownTimeZoneError:
+            return pytz.UTC
+    names = _OFFSET_TABLES[True].get(_get_offset_seconds(tz))
+    return pytz.timezone(names[0]) if names else pytz.UTC
+
 
-    return results
\ No newline at end of file
+def get_timezone_name(date):
+    """Canonical name of the timezone of a date, used to store it with the poll"""
+    zone = getattr(date.tzinfo, 'zone', None)
+    if zone in pytz.all_timezones_set and zone != 'UTC':
+        return zone
+    # fixed offsets (e.g. "CET" from the date parser) map to the timezone that was looked up for them before
+    return get_timezone(date.utcoffset().total_seconds() / 3600).zone
@@ -0,0 +1,64 @@
+import functools
+
+from unidecode import unidecode
+
+# Helvetica is the closest font to Whitney (discord uses Whitney) in afm
+# The metrics of the printable ascii characters are taken from the phvr8a.afm that matplotlib ships,
+# in 1/1000 of the font size. Texts are transliterated to ascii with unidecode before measuring.
+
+# width of the characters ' ' (32) to '~' (126)
+_WIDTHS = (
+    278, 278, 355, 556, 556, 889, 667, 222, 333, 333, 389, 584, 278, 333, 278, 278, 556, 556, 556, 556, 556, 556,
+    556, 556, 556, 556, 278, 278, 584, 584, 584, 556, 1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667,
+    556, 833, 722, 778, 667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556, 222, 556,
+    556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556, 556, 556, 333, 500, 278, 556, 500, 722,
+    500, 500, 500, 334, 260, 334, 584
+)
+
+# kerning between two characters, added to the width when they follow each other
+_KERNING = {
+    ' T': -50, ' V': -50, ' W': -40, ' Y': -90, ' `': -60, "' ": -70, "''": -57, "'d": -50, "'r": -50, "'s": -50,
+    ",'": -100, '. ': -60, ".'": -100, ': ': -50, '; ': -50, 'AC': -30, 'AG': -30, 'AO': -30, 'AQ': -30, 'AT': -120,
+    'AU': -50, 'AV': -70, 'AW': -50, 'AY': -100, 'Au': -30, 'Av': -40, 'Aw': -40, 'Ay': -40, 'B,': -20, 'B.': -20,
+    'BU': -10, 'C,': -30, 'C.': -30, 'D,': -70, 'D.': -70, 'DA': -40, 'DV': -70, 'DW': -40, 'DY': -90, 'F,': -150,
+    'F.': -150, 'FA': -80, 'Fa': -50, 'Fe': -30, 'Fo': -30, 'Fr': -45, 'J,': -30, 'J.': -30, 'JA': -20, 'Ja': -20,
+    'Ju': -20, 'KO': -50, 'Ke': -40, 'Ko': -40, 'Ku': -30, 'Ky': -50, "L'": -160, 'LT': -110, 'LV': -110, 'LW': -70,
+    'LY': -140, 'Ly': -30, 'O,': -40, 'O.': -40, 'OA': -20, 'OT': -40, 'OV': -50, 'OW': -30, 'OX': -60, 'OY': -70,
+    'P,': -180, 'P.': -180, 'PA': -120, 'Pa': -40, 'Pe': -50, 'Po': -50, 'QU': -10, 'RO': -20, 'RT': -30, 'RU': -40,
+    'RV': -50, 'RW': -30, 'RY': -50, 'S,': -20, 'S.': -20, 'T,': -120, 'T-': -140, 'T.': -120, 'T:': -20, 'T;': -20,
+    'TA': -120, 'TO': -40, 'Ta': -120, 'Te': -120, 'To': -120, 'Tr': -120, 'Tu': -120, 'Tw': -120, 'Ty': -120,
+    'U,': -40, 'U.': -40, 'UA': -40, 'V,': -125, 'V-': -80, 'V.': -125, 'V:': -40, 'V;': -40, 'VA': -80, 'VG': -40,
+    'VO': -40, 'Va': -70, 'Ve': -80, 'Vo': -80, 'Vu': -70, 'W,': -80, 'W-': -40, 'W.': -80, 'WA': -50, 'WO': -20,
+    'Wa': -40, 'We': -30, 'Wo': -30, 'Wu': -30, 'Wy': -20, 'Y,': -140, 'Y-': -140, 'Y.': -140, 'Y:': -60, 'Y;': -60,
+    'YA': -110, 'YO': -85, 'Ya': -140, 'Ye': -140, 'Yi': -20, 'Yo': -140, 'Yu': -110, '``': -57, 'av': -20,
+    'aw': -20, 'ay': -30, 'b,': -40, 'b.': -40, 'bb': -10, 'bl': -20, 'bu': -20, 'bv': -20, 'by': -20, 'c,': -15,
+    'ck': -20, 'e,': -15, 'e.': -15, 'ev': -30, 'ew': -20, 'ex': -30, 'ey': -20, "f'": 50, 'f,': -30, 'f.': -30,
+    'fa': -30, 'fe': -30, 'fo': -30, 'gr': -10, 'hy': -30, 'ke': -20, 'ko': -20, 'mu': -10, 'my': -15, 'nu': -10,
+    'nv': -20, 'ny': -15, 'o,': -40, 'o.': -40, 'ov': -15, 'ow': -15, 'ox': -30, 'oy': -30, 'p,': -35, 'p.': -35,
+    'py': -30, 'r,': -50, 'r.': -50, 'r:': 30, 'r;': 30, 'ra': -10, 'ri': 15, 'rk': 15, 'rl': 15, 'rm': 25,
+    'rn': 25, 'rp': 30, 'rt': 40, 'ru': 15, 'rv': 30, 'ry': 30, 's,': -15, 's.': -15, 'sw': -30, 'v,': -80,
+    'v.': -80, 'va': -25, 've': -25, 'vo': -25, 'w,': -60, 'w.': -60, 'wa': -15, 'we': -10, 'wo': -10, 'xe': -30,
+    'y,': -100, 'y.': -100, 'ya': -20, 'ye': -20, 'yo': -20, 'ze': -15, 'zo': -15
+}
+
+
+def get_string_width(s):
+    """Width of an ascii string, the same as matplotlib's AFM.string_width_height but without loading the font"""
+    total_width = 0
+    last = None
+    for c in s:
+        if c == '\n':
+            continue
+        code = ord(c)
+        if 32 <= code < 127:
+            total_width += _WIDTHS[code - 32]
+        if last is not None:
+            total_width += _KERNING.get(last + c, 0)
+        last = c
+    return total_width
+
+
+@functools.lru_cache(maxsize=4096)
+def get_text_width(text):
+    """Estimated width of a text in an embed. Cached, since the same options are measured on every refresh."""
+    return get_string_width(unidecode(text))